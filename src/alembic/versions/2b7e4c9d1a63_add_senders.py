@@ -0,0 +1,169 @@
+"""add_senders
+
+Revision ID: 2b7e4c9d1a63
+Revises: f1d3a9c7e2b4
+Create Date: 2026-10-18 16:11:38.672045
+
+"""
+from email.utils import parseaddr
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7e4c9d1a63'
+down_revision: Union[str, Sequence[str], None] = 'f1d3a9c7e2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}subject, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({sender}, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}snippet, '')), 'C')
+"""
+
+
+def parse_from(from_email: str) -> tuple[str, str | None]:
+    # Same rules as GoogleEmailProvider._to_email and SenderResolver, so
+    # backfilled and newly synced rows share one sender per address.
+    from_name, from_address = parseaddr(from_email)
+    return (from_address or from_email).lower(), from_name[:255] or None
+
+
+def create_senders() -> None:
+    # Raw From headers are parsed in Python and mapped to their address in
+    # the temporary sender_map table, which the UPDATEs then join against.
+    conn = op.get_bind()
+    from_emails = conn.execute(sa.text(
+        "SELECT from_email FROM emails UNION SELECT from_email FROM emails_archive"
+    )).scalars().all()
+
+    senders: dict[str, str | None] = {}
+    mapping = []
+    for from_email in from_emails:
+        address, display_name = parse_from(from_email)
+        # The smallest name wins when one address comes with several.
+        if address not in senders or (
+            display_name and (senders[address] is None or display_name < senders[address])
+        ):
+            senders[address] = display_name
+        mapping.append({'from_email': from_email, 'address': address})
+
+    senders_table = sa.table('senders', sa.column('address'), sa.column('display_name'))
+    rows = [
+        {'address': address, 'display_name': display_name}
+        for address, display_name in sorted(senders.items())
+    ]
+    for start in range(0, len(rows), BATCH_SIZE):
+        op.bulk_insert(senders_table, rows[start:start + BATCH_SIZE])
+
+    op.execute("""
+        CREATE TEMPORARY TABLE sender_map (
+            from_email varchar(255) PRIMARY KEY,
+            address varchar(255) NOT NULL
+        )
+    """)
+    sender_map = sa.table('sender_map', sa.column('from_email'), sa.column('address'))
+    for start in range(0, len(mapping), BATCH_SIZE):
+        op.bulk_insert(sender_map, mapping[start:start + BATCH_SIZE])
+
+
+def move_to_senders(table_name: str) -> None:
+    op.execute(f"""
+        UPDATE {table_name} e SET sender_id = s.id
+        FROM sender_map m
+        JOIN senders s ON s.address = m.address
+        WHERE m.from_email = e.from_email
+    """)
+    op.alter_column(table_name, 'sender_id', nullable=False)
+    op.create_foreign_key(
+        f'{table_name}_sender_id_fkey', table_name, 'senders', ['sender_id'], ['id']
+    )
+    op.drop_column(table_name, 'from_email')
+
+
+def move_from_senders(table_name: str) -> None:
+    op.add_column(table_name, sa.Column('from_email', sa.String(length=255), nullable=True))
+    op.execute(f"""
+        UPDATE {table_name} e SET from_email = CASE
+            WHEN s.display_name IS NULL THEN s.address
+            ELSE left(s.display_name || ' <' || s.address || '>', 255)
+        END
+        FROM senders s
+        WHERE s.id = e.sender_id
+    """)
+    op.alter_column(table_name, 'from_email', nullable=False)
+    op.drop_column(table_name, 'sender_id')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('senders',
+    sa.Column('address', sa.String(length=255), nullable=False),
+    sa.Column('display_name', sa.String(length=255), nullable=True),
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('address')
+    )
+    create_senders()
+
+    # The search trigger reads the sender from senders now. It is swapped
+    # before the backfill, so that single UPDATE also refreshes search_vector.
+    op.execute('DROP TRIGGER emails_search_vector_update ON emails')
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION emails_search_vector_update() RETURNS trigger AS $$
+        DECLARE
+            sender text;
+        BEGIN
+            SELECT concat_ws(' ', display_name, address) INTO sender
+            FROM senders WHERE id = NEW.sender_id;
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.', sender='sender')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.add_column('emails', sa.Column('sender_id', sa.Integer(), nullable=True))
+    op.add_column('emails_archive', sa.Column('sender_id', sa.Integer(), nullable=True))
+    op.execute("""
+        CREATE TRIGGER emails_search_vector_update
+        BEFORE INSERT OR UPDATE OF subject, sender_id, snippet ON emails
+        FOR EACH ROW EXECUTE FUNCTION emails_search_vector_update()
+    """)
+    move_to_senders('emails')
+    move_to_senders('emails_archive')
+    op.execute('DROP TABLE sender_map')
+    op.create_index(
+        'ix_emails_user_email_id_sender_id_recieved_at_id',
+        'emails',
+        ['user_email_id', 'sender_id', sa.text('recieved_at DESC'), 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emails_user_email_id_sender_id_recieved_at_id', table_name='emails')
+    op.execute('DROP TRIGGER emails_search_vector_update ON emails')
+    move_from_senders('emails_archive')
+    move_from_senders('emails')
+    op.drop_table('senders')
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION emails_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.', sender='NEW.from_email')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER emails_search_vector_update
+        BEFORE INSERT OR UPDATE OF subject, from_email, snippet ON emails
+        FOR EACH ROW EXECUTE FUNCTION emails_search_vector_update()
+    """)
+    op.execute(f"UPDATE emails SET search_vector = {SEARCH_VECTOR_SQL.format(row='', sender='from_email')}")
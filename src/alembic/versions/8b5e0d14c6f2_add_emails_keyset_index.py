@@ -0,0 +1,41 @@
+"""add_emails_keyset_index
+
+Revision ID: 8b5e0d14c6f2
+Revises: 3f1c8b2d7a4e
+Create Date: 2026-10-18 11:02:17.448930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b5e0d14c6f2'
+down_revision: Union[str, Sequence[str], None] = '3f1c8b2d7a4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently so existing mailboxes stay writable meanwhile.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_emails_user_email_id_recieved_at_id',
+            'emails',
+            ['user_email_id', sa.text('recieved_at DESC'), 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_emails_user_email_id_recieved_at_id',
+            table_name='emails',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,60 @@
+"""add_emails_search_vector
+
+Revision ID: c27d94e1f5a8
+Revises: 8b5e0d14c6f2
+Create Date: 2026-10-18 13:40:05.912377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c27d94e1f5a8'
+down_revision: Union[str, Sequence[str], None] = '8b5e0d14c6f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}subject, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}from_email, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}snippet, '')), 'C')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # btree_gin lets user_email_id share one GIN index with the tsvector.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    op.add_column('emails', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute(f"""
+        CREATE FUNCTION emails_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER emails_search_vector_update
+        BEFORE INSERT OR UPDATE OF subject, from_email, snippet ON emails
+        FOR EACH ROW EXECUTE FUNCTION emails_search_vector_update()
+    """)
+    op.execute(f"UPDATE emails SET search_vector = {SEARCH_VECTOR_SQL.format(row='')}")
+    op.create_index(
+        'ix_emails_user_email_id_search_vector',
+        'emails',
+        ['user_email_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emails_user_email_id_search_vector', table_name='emails', postgresql_using='gin')
+    op.execute('DROP TRIGGER emails_search_vector_update ON emails')
+    op.execute('DROP FUNCTION emails_search_vector_update()')
+    op.drop_column('emails', 'search_vector')
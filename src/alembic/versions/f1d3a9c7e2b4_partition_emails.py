@@ -0,0 +1,111 @@
+"""partition_emails
+
+Revision ID: f1d3a9c7e2b4
+Revises: e5a1f7c3b902
+Create Date: 2026-10-18 15:04:51.230914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1d3a9c7e2b4'
+down_revision: Union[str, Sequence[str], None] = 'e5a1f7c3b902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMAILS_PARTITIONS = 16
+
+
+def create_emails_constraints() -> None:
+    op.create_foreign_key(
+        'emails_user_email_id_fkey', 'emails', 'user_emails',
+        ['user_email_id'], ['id'], ondelete='CASCADE',
+    )
+    op.create_unique_constraint(
+        'uq_emails_external_id_user_email_id', 'emails', ['user_email_id', 'external_id']
+    )
+    op.create_index(
+        'ix_emails_user_email_id_recieved_at_id',
+        'emails',
+        ['user_email_id', sa.text('recieved_at DESC'), 'id'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_emails_user_email_id_search_vector',
+        'emails',
+        ['user_email_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+    op.execute("""
+        CREATE TRIGGER emails_search_vector_update
+        BEFORE INSERT OR UPDATE OF subject, from_email, snippet ON emails
+        FOR EACH ROW EXECUTE FUNCTION emails_search_vector_update()
+    """)
+
+
+def swap_emails_table() -> None:
+    # The id sequence is owned by the old table and would be dropped with it.
+    op.execute('INSERT INTO emails_new SELECT * FROM emails')
+    op.execute('ALTER SEQUENCE emails_id_seq OWNED BY NONE')
+    op.drop_table('emails')
+    op.rename_table('emails_new', 'emails')
+    op.execute('ALTER SEQUENCE emails_id_seq OWNED BY emails.id')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Every query filters by user_email_id, so hash partitions on it keep
+    # each mailbox in one partition and let vacuum work per partition.
+    # Rows are copied under an exclusive lock, run it in a maintenance window.
+    op.execute('LOCK TABLE emails IN ACCESS EXCLUSIVE MODE')
+    op.execute("""
+        CREATE TABLE emails_new (LIKE emails INCLUDING DEFAULTS)
+        PARTITION BY HASH (user_email_id)
+    """)
+    for remainder in range(EMAILS_PARTITIONS):
+        op.execute(f"""
+            CREATE TABLE emails_p{remainder} PARTITION OF emails_new
+            FOR VALUES WITH (MODULUS {EMAILS_PARTITIONS}, REMAINDER {remainder})
+        """)
+    swap_emails_table()
+    # Keys of a partitioned table must include the partition key.
+    op.create_primary_key('emails_pkey', 'emails', ['id', 'user_email_id'])
+    create_emails_constraints()
+
+    op.create_table('emails_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_email_id', sa.Integer(), nullable=False),
+    sa.Column('external_id', sa.String(length=255), nullable=False),
+    sa.Column('from_email', sa.String(length=255), nullable=False),
+    sa.Column('subject', sa.String(length=511), nullable=False),
+    sa.Column('snippet', sa.String(length=511), nullable=False),
+    sa.Column('recieved_at', sa.DateTime(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_email_id'], ['user_emails.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'user_email_id')
+    )
+    op.create_index(
+        'ix_emails_archive_user_email_id_recieved_at',
+        'emails_archive',
+        ['user_email_id', 'recieved_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emails_archive_user_email_id_recieved_at', table_name='emails_archive')
+    op.drop_table('emails_archive')
+
+    op.execute('LOCK TABLE emails IN ACCESS EXCLUSIVE MODE')
+    op.execute('CREATE TABLE emails_new (LIKE emails INCLUDING DEFAULTS)')
+    swap_emails_table()
+    op.create_primary_key('emails_pkey', 'emails', ['id'])
+    create_emails_constraints()
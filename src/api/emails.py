@@ -1,10 +1,31 @@
 from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Query
+from fastapi.responses import Response, StreamingResponse
 from fastapi.routing import APIRouter
 
-from depends import get_current_user, get_email_service
-from services.auth.dtos import EmailSyncData, UserOut
+from api.responses import PydanticJSONResponse
+from depends import (
+    get_action_job_queue,
+    get_current_user,
+    get_email_service,
+    get_sync_job_queue,
+)
+from services.auth.dtos import EmailSyncAllData, EmailSyncData, UserOut
+from services.emails.dtos import (
+    EmailActionData,
+    EmailActionJobOut,
+    EmailActionResult,
+    EmailContentOut,
+    EmailPage,
+    EmailSearchPage,
+    MailboxStatsOut,
+    SyncAllEmailsOut,
+    SyncEmailsOut,
+    SyncJobCreated,
+    SyncJobOut,
+)
+from services.emails.jobs import EmailActionJobQueue, SyncJobQueue
 from services.emails.sync import EmailService
 
 router = APIRouter(prefix="/emails", tags=["emails"])
@@ -15,10 +36,66 @@ async def sync_emails(
     data: EmailSyncData,
     current_user: Annotated[UserOut, Depends(get_current_user)],
     email_service: Annotated[EmailService, Depends(get_email_service)],
-):
+) -> SyncEmailsOut:
     return await email_service.sync_emails(data=data, current_user=current_user)
 
 
+@router.post("/sync/all")
+async def sync_all_emails(
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    email_service: Annotated[EmailService, Depends(get_email_service)],
+    data: EmailSyncAllData = EmailSyncAllData(),
+) -> SyncAllEmailsOut:
+    return await email_service.sync_all_emails(data=data, current_user=current_user)
+
+
+@router.post("/sync/jobs")
+async def create_sync_job(
+    data: EmailSyncData,
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    queue: Annotated[SyncJobQueue, Depends(get_sync_job_queue)],
+) -> SyncJobCreated:
+    job_id = await queue.enqueue(data, current_user)
+    return SyncJobCreated(job_id=job_id)
+
+
+@router.get("/sync/jobs/{job_id}")
+async def get_sync_job(
+    job_id: str,
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    queue: Annotated[SyncJobQueue, Depends(get_sync_job_queue)],
+) -> SyncJobOut:
+    return await queue.get(job_id, current_user.id)
+
+
+@router.post("/actions")
+async def apply_email_action(
+    data: EmailActionData,
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    email_service: Annotated[EmailService, Depends(get_email_service)],
+) -> EmailActionResult:
+    return await email_service.apply_action(data=data, current_user=current_user)
+
+
+@router.post("/actions/jobs")
+async def create_action_job(
+    data: EmailActionData,
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    queue: Annotated[EmailActionJobQueue, Depends(get_action_job_queue)],
+) -> SyncJobCreated:
+    job_id = await queue.enqueue(data, current_user)
+    return SyncJobCreated(job_id=job_id)
+
+
+@router.get("/actions/jobs/{job_id}")
+async def get_action_job(
+    job_id: str,
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    queue: Annotated[EmailActionJobQueue, Depends(get_action_job_queue)],
+) -> EmailActionJobOut:
+    return await queue.get(job_id, current_user.id)
+
+
 @router.get("/addresses")
 async def get_emails_addresses(
     current_user: Annotated[UserOut, Depends(get_current_user)],
@@ -26,10 +103,77 @@ async def get_emails_addresses(
     return current_user.emails
 
 
-@router.get("/")
+@router.get("/", response_model=EmailPage)
 async def get_emails(
-    _: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[UserOut, Depends(get_current_user)],
     user_email: str,
     email_service: Annotated[EmailService, Depends(get_email_service)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+    sender: str | None = None,
+):
+    page = await email_service.get_emails(
+        user_email_str=user_email,
+        current_user=current_user,
+        cursor=cursor,
+        limit=limit,
+        sender=sender,
+    )
+    return PydanticJSONResponse(page)
+
+
+@router.get("/export")
+async def export_emails(
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    user_email: str,
+    email_service: Annotated[EmailService, Depends(get_email_service)],
+):
+    rows = await email_service.export_emails(
+        user_email_str=user_email,
+        current_user=current_user,
+    )
+    return StreamingResponse(rows, media_type="application/x-ndjson")
+
+
+@router.get("/search", response_model=EmailSearchPage)
+async def search_emails(
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    user_email: str,
+    q: Annotated[str, Query(min_length=1, max_length=255)],
+    email_service: Annotated[EmailService, Depends(get_email_service)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    page = await email_service.search_emails(
+        user_email_str=user_email,
+        current_user=current_user,
+        query=q,
+        cursor=cursor,
+        limit=limit,
+    )
+    return PydanticJSONResponse(page)
+
+
+@router.get("/stats")
+async def get_mailbox_stats(
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    user_email: str,
+    email_service: Annotated[EmailService, Depends(get_email_service)],
+    top_senders: Annotated[int, Query(ge=0, le=100)] = 10,
+) -> MailboxStatsOut:
+    return await email_service.get_mailbox_stats(
+        user_email_str=user_email,
+        current_user=current_user,
+        top_senders=top_senders,
+    )
+
+
+@router.get("/{email_id}/content", response_model=EmailContentOut)
+async def get_email_content(
+    email_id: int,
+    current_user: Annotated[UserOut, Depends(get_current_user)],
+    email_service: Annotated[EmailService, Depends(get_email_service)],
 ):
-    return await email_service.get_emails(user_email_str=user_email)
\ No newline at end of file
+    # Cached as serialized JSON, so it is sent as is.
+    content = await email_service.get_email_content(email_id, current_user)
+    return Response(content, media_type="application/json")
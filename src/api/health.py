@@ -0,0 +1,38 @@
+import logging
+from typing import Annotated
+
+from fastapi import Depends, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRouter
+
+from clients import redis_pool_stats, warm_up
+from config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/pools")
+async def get_pools_stats(request: Request):
+    return {
+        "redis": redis_pool_stats(request.app.state.redis_pool),
+    }
+
+
+@router.get("/ready")
+async def get_readiness(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+):
+    state = request.app.state
+    if not state.ready:
+        # The startup warm-up failed (e.g. Postgres wasn't up yet), so the
+        # probe retries it until the pools are filled.
+        try:
+            await warm_up(settings, state.redis_pool, state.http_client)
+        except Exception as exc:
+            logger.warning("Warm-up failed: %r", exc)
+            return JSONResponse(status_code=503, content={"status": "warming_up"})
+        state.ready = True
+    return {"status": "ready"}
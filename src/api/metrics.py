@@ -0,0 +1,29 @@
+import logging
+from typing import Annotated
+
+import redis.asyncio as redis
+from fastapi import Depends
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRouter
+
+from depends import get_redis_client
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(redis_client: Annotated[redis.Redis, Depends(get_redis_client)]):
+    # Shared counters come from Redis. Without it the last loaded totals
+    # are served rather than failing the whole scrape.
+    try:
+        await REGISTRY.flush_shared(redis_client)
+        await REGISTRY.load_shared(redis_client)
+    except redis.RedisError:
+        logger.warning("Could not load shared metrics", exc_info=True)
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4",
+    )
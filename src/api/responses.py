@@ -0,0 +1,12 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class PydanticJSONResponse(JSONResponse):
+    # Serializes in pydantic-core (Rust) and skips jsonable_encoder, which
+    # walks every value in Python. Routes return it directly, so FastAPI
+    # doesn't re-validate content against response_model either.
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
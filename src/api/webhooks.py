@@ -0,0 +1,21 @@
+from typing import Annotated
+
+from fastapi import Depends, Header
+from fastapi.routing import APIRouter
+
+from depends import get_gmail_push_service
+from services.emails.dtos import GmailPushOut, PubSubEnvelope
+from services.emails.push import GmailPushService
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+
+
+@router.post("/gmail")
+async def gmail_push(
+    envelope: PubSubEnvelope,
+    push_service: Annotated[GmailPushService, Depends(get_gmail_push_service)],
+    token: str | None = None,
+    authorization: Annotated[str | None, Header()] = None,
+) -> GmailPushOut:
+    await push_service.authenticate(token, authorization)
+    return await push_service.handle(envelope)
@@ -0,0 +1,295 @@
+import asyncio
+import base64
+import gzip
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+from urllib.parse import parse_qs
+
+import httpx
+
+MESSAGE_PATH = re.compile(r"^/gmail/v1/users/me/messages/(?P<id>[^/?]+)$")
+BATCH_ITEM = re.compile(
+    r"GET /gmail/v1/users/me/messages/(?P<id>[^?\s]+)(?:\?(?P<query>\S*))?"
+)
+FIELD_NAME = re.compile(r"[\w/]+")
+
+
+def parse_fields(spec: str, pos: int = 0) -> tuple[dict, int]:
+    # The subset of the partial response syntax the provider uses:
+    # "a,b/c,d(e,f/g)". Leaves map to None, meaning "the whole value".
+    tree = {}
+    while pos < len(spec):
+        match = FIELD_NAME.match(spec, pos)
+        *parents, name = match.group().split("/")
+        pos = match.end()
+        node = tree
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        if pos < len(spec) and spec[pos] == "(":
+            subtree, pos = parse_fields(spec, pos + 1)
+            node.setdefault(name, {}).update(subtree)
+            pos += 1
+        else:
+            node[name] = None
+        if pos < len(spec) and spec[pos] == ")":
+            break
+        if pos < len(spec) and spec[pos] == ",":
+            pos += 1
+    return tree, pos
+
+
+def project(data, tree: dict | None):
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [project(item, tree) for item in data]
+    return {key: project(data[key], subtree) for key, subtree in tree.items() if key in data}
+
+
+@dataclass
+class FakeGmailStats:
+    requests: int = 0
+    batch_items: int = 0
+    unauthorized: int = 0
+    rate_limited: int = 0
+    bytes_sent: int = 0
+    by_endpoint: dict[str, int] = field(default_factory=dict)
+
+
+class FakeGmail:
+    # In-process stand-in for the Gmail and Google token APIs, served
+    # through httpx.MockTransport so no real sockets are opened.
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        unauthorized_every: int = 0,
+        rate_limit_every: int = 0,
+        retry_after: float = 1.0,
+        history_changes: int = 0,
+    ):
+        self.latency = latency
+        self.unauthorized_every = unauthorized_every
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.history_changes = history_changes
+        self.stats = FakeGmailStats()
+        self._generation = 0
+        self._epoch = datetime(2026, 1, 1)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def new_generation(self) -> None:
+        # Messages ids change per generation, so each sync inserts new rows.
+        self._generation += 1
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+        # Other requests bump the counter while this one sleeps, so faults
+        # are decided by this request's own number.
+        n = self.stats.requests
+        endpoint = self._endpoint(request)
+        self.stats.by_endpoint[endpoint] = self.stats.by_endpoint.get(endpoint, 0) + 1
+        await asyncio.sleep(self.latency)
+
+        if endpoint != "token":
+            if self.unauthorized_every and n % self.unauthorized_every == 0:
+                self.stats.unauthorized += 1
+                return httpx.Response(401, json={"error": "unauthorized"})
+            if self.rate_limit_every and n % self.rate_limit_every == 0:
+                self.stats.rate_limited += 1
+                return httpx.Response(
+                    429,
+                    json={"error": "rateLimitExceeded"},
+                    headers={"Retry-After": str(self.retry_after)},
+                )
+
+        response = getattr(self, f"_handle_{endpoint}")(request)
+        self.stats.bytes_sent += int(response.headers.get("Content-Length", 0))
+        return response
+
+    def _endpoint(self, request: httpx.Request) -> str:
+        path = request.url.path
+        if request.url.host == "oauth2.googleapis.com":
+            return "token"
+        if path.startswith("/batch/"):
+            return "batch"
+        if path.endswith("/messages"):
+            return "list"
+        if path.endswith("/profile"):
+            return "profile"
+        if path.endswith("/history"):
+            return "history"
+        if path.endswith("/watch"):
+            return "watch"
+        if path.endswith("/batchModify"):
+            return "batch_modify"
+        return "get"
+
+    def _message_id(self, index: int) -> str:
+        return f"{self._generation:04x}{index:012x}"
+
+    def message(self, message_id: str) -> dict:
+        index = int(message_id[4:], 16)
+        recieved_at = self._epoch - timedelta(minutes=index)
+        return {
+            "id": message_id,
+            "threadId": message_id,
+            "labelIds": ["INBOX", "UNREAD"] if index % 3 else ["INBOX"],
+            "snippet": f"Fake message {index} body preview text for benchmarking",
+            "historyId": str(1000 + self._generation),
+            "internalDate": str(int(recieved_at.timestamp() * 1000)),
+            "sizeEstimate": 2048,
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": [
+                    {"name": "Delivered-To", "value": "bench@gmail.com"},
+                    {"name": "Received", "value": "by 2002:a05:6000:1 with SMTP id x; " * 3},
+                    {"name": "X-Google-Smtp-Source", "value": "A" * 120},
+                    {"name": "DKIM-Signature", "value": "v=1; a=rsa-sha256; " + "b" * 300},
+                    {"name": "From", "value": f"Sender {index % 50} <sender{index % 50}@example.com>"},
+                    {"name": "Subject", "value": f"Fake subject {index}"},
+                    {"name": "Date", "value": format_datetime(recieved_at)},
+                    {"name": "Message-ID", "value": f"<{message_id}@example.com>"},
+                ],
+            },
+        }
+
+    def message_view(self, message_id: str, params: httpx.QueryParams) -> dict:
+        message = self.message(message_id)
+        if params.get("format") == "metadata" and "metadataHeaders" in params:
+            wanted = {name.lower() for name in params.get_list("metadataHeaders")}
+            message["payload"]["headers"] = [
+                header for header in message["payload"]["headers"]
+                if header["name"].lower() in wanted
+            ]
+        return message
+
+    def _respond(
+        self,
+        request: httpx.Request,
+        body: bytes,
+        content_type: str = "application/json; charset=UTF-8",
+    ) -> httpx.Response:
+        # Like Google: gzip only when asked for and the User-Agent says gzip.
+        headers = {"Content-Type": content_type}
+        if (
+            "gzip" in request.headers.get("Accept-Encoding", "")
+            and "gzip" in request.headers.get("User-Agent", "")
+        ):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(body))
+        # A raw stream, so the client counts the bytes it downloaded.
+        return httpx.Response(200, stream=httpx.ByteStream(body), headers=headers)
+
+    def _json(self, request: httpx.Request, data: dict) -> httpx.Response:
+        fields = request.url.params.get("fields")
+        if fields:
+            data = project(data, parse_fields(fields)[0])
+        return self._respond(request, json.dumps(data).encode())
+
+    def _handle_token(self, request: httpx.Request) -> httpx.Response:
+        form = parse_qs(request.content.decode())
+        return httpx.Response(200, json={
+            "access_token": f"fake-{form.get('refresh_token', ['token'])[0]}-{self.stats.requests}",
+            "expires_in": 3600,
+            "token_type": "Bearer",
+        })
+
+    def _handle_list(self, request: httpx.Request) -> httpx.Response:
+        count = int(request.url.params.get("maxResults", 100))
+        return self._json(request, {
+            "messages": [
+                {"id": self._message_id(index), "threadId": self._message_id(index)}
+                for index in range(count)
+            ],
+            "resultSizeEstimate": count,
+        })
+
+    def _handle_get(self, request: httpx.Request) -> httpx.Response:
+        match = MESSAGE_PATH.match(request.url.path)
+        message = self.message_view(match["id"], request.url.params)
+        if request.url.params.get("format") == "full":
+            body = f"{message['snippet']}\n\n" + "Fake message body line.\n" * 40
+            message["payload"]["body"] = {
+                "size": len(body),
+                "data": base64.urlsafe_b64encode(body.encode()).decode(),
+            }
+        return self._json(request, message)
+
+    def _handle_profile(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "emailAddress": "bench@gmail.com",
+            "historyId": str(1000 + self._generation),
+        })
+
+    def _handle_history(self, request: httpx.Request) -> httpx.Response:
+        return self._json(request, {
+            "history": [
+                {
+                    "id": str(1000 + self._generation - self.history_changes + index + 1),
+                    "messagesAdded": [{"message": {"id": self._message_id(index)}}],
+                }
+                for index in range(self.history_changes)
+            ],
+            "historyId": str(1000 + self._generation),
+        })
+
+    def _handle_watch(self, request: httpx.Request) -> httpx.Response:
+        expires_at = datetime.now() + timedelta(days=7)
+        return httpx.Response(200, json={
+            "historyId": str(1000 + self._generation),
+            "expiration": str(int(expires_at.timestamp() * 1000)),
+        })
+
+    def _handle_batch_modify(self, request: httpx.Request) -> httpx.Response:
+        if len(json.loads(request.content)["ids"]) > 1000:
+            return httpx.Response(400, json={"error": {"message": "Too many ids."}})
+        return httpx.Response(204)
+
+    def push_envelope(self, email_address: str) -> dict:
+        # Body Pub/Sub would POST to /webhooks/gmail for the current generation.
+        data = json.dumps({
+            "emailAddress": email_address,
+            "historyId": 1000 + self._generation,
+        })
+        return {
+            "message": {
+                "data": base64.b64encode(data.encode()).decode(),
+                "messageId": f"fake-{self._generation}-{self.stats.requests}",
+                "publishTime": datetime.now().isoformat() + "Z",
+            },
+            "subscription": "projects/fake/subscriptions/gmail-push",
+        }
+
+    def _handle_batch(self, request: httpx.Request) -> httpx.Response:
+        boundary = "batch_fake_response"
+        parts = []
+        for index, match in enumerate(BATCH_ITEM.finditer(request.content.decode())):
+            self.stats.batch_items += 1
+            params = httpx.QueryParams(match["query"] or "")
+            message = self.message_view(match["id"], params)
+            if "fields" in params:
+                message = project(message, parse_fields(params["fields"])[0])
+            body = json.dumps(message)
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-item{index}>\r\n"
+                "\r\n"
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                "\r\n"
+                f"{body}\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        return self._respond(
+            request,
+            "".join(parts).encode(),
+            content_type=f"multipart/mixed; boundary={boundary}",
+        )
@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+import redis.asyncio as redis
+
+from benchmarks.sync import create_mailboxes, drop_user
+from clients import create_redis_pool
+from config import get_settings
+from db.utils import dispose_engines, init_engines
+from services.auth.cache import UserCache, get_local_user_cache
+from services.auth.tokens import JWT_ALGORITHM
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def measure_import(rounds: int) -> float:
+    # Fresh interpreters, so nothing is cached in sys.modules.
+    timings = [
+        float(subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            capture_output=True, check=True, text=True,
+        ).stdout)
+        for _ in range(rounds)
+    ]
+    return statistics.median(timings) * 1000
+
+
+async def timed_get(client: httpx.AsyncClient, url: str, token: str) -> float:
+    started = time.perf_counter()
+    resp = await client.get(url, headers={"Authorization": f"Bearer {token}"})
+    resp.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run_case(warmup: int, burst: int, requests: int, email: str, token: str) -> dict:
+    # Settings are read from the environment, so the warm-up size is set
+    # there and the cached instance dropped.
+    os.environ["POSTGRES_WARMUP_CONNECTIONS"] = str(warmup)
+    os.environ["REDIS_WARMUP_CONNECTIONS"] = str(warmup)
+    get_settings.cache_clear()
+    settings = get_settings()
+
+    # Drop the cached user too, so every case's first requests hit Postgres.
+    get_local_user_cache.cache_clear()
+    redis_pool = create_redis_pool(settings)
+    try:
+        await UserCache(redis.Redis(connection_pool=redis_pool), settings).invalidate([email])
+    finally:
+        await redis_pool.aclose()
+
+    import main
+
+    url = f"/emails/stats?user_email={email}"
+    started = time.perf_counter()
+    async with main.lifespan(main.app):
+        startup = time.perf_counter() - started
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # A burst right after startup, like traffic hitting a fresh pod.
+            first = await asyncio.gather(*(
+                timed_get(client, url, token) for _ in range(burst)
+            ))
+            steady = [await timed_get(client, url, token) for _ in range(requests)]
+    return {
+        "warmup": warmup,
+        "startup_ms": startup * 1000,
+        "first_max_ms": max(first) * 1000,
+        "first_p50_ms": statistics.median(first) * 1000,
+        "steady_p50_ms": statistics.median(steady) * 1000,
+    }
+
+
+def print_report(import_ms: float, rows: list[dict]) -> None:
+    print(f"import main: {import_ms:.1f} ms")
+    header = (
+        f"{'warmup':>6} {'startup ms':>11} {'first max ms':>13} "
+        f"{'first p50 ms':>13} {'steady p50 ms':>14}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['warmup']:>6} {row['startup_ms']:>11.1f} {row['first_max_ms']:>13.1f} "
+            f"{row['first_p50_ms']:>13.1f} {row['steady_p50_ms']:>14.1f}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Cold start and first request latency against local Postgres/Redis.",
+    )
+    parser.add_argument("--warmup", type=int, nargs="+", default=[0, 4])
+    parser.add_argument("--burst", type=int, default=8, help="concurrent first requests")
+    parser.add_argument("--requests", type=int, default=50, help="sequential requests after the burst")
+    parser.add_argument("--import-rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    init_engines(settings)
+    user_id, mailboxes = await create_mailboxes(1)
+    # Every case starts from cold pools.
+    await dispose_engines()
+    email = mailboxes[0].email
+    token = jwt.encode(
+        {"sub": email, "exp": datetime.now() + timedelta(hours=1)},
+        settings.secret_key,
+        algorithm=JWT_ALGORITHM,
+    )
+
+    rows = []
+    try:
+        for warmup in args.warmup:
+            rows.append(await run_case(warmup, args.burst, args.requests, email, token))
+    finally:
+        init_engines(settings)
+        await drop_user(user_id)
+        await dispose_engines()
+    print_report(measure_import(args.import_rounds), rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
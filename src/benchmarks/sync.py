@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import httpx
+import redis.asyncio as redis
+from sqlalchemy import delete, event
+
+from benchmarks.fake_gmail import FakeGmail
+from clients import create_redis_pool
+from config import Settings, get_settings
+from db.models import ProviderType, User, UserEmail
+import db.utils as db_utils
+from db.utils import dispose_engines, init_engines, sessionmaker
+from errors import ClientError
+from metrics import SYNC_STAGE_SECONDS
+from services.auth.cache import UserCache
+from services.auth.dtos import EmailSyncData
+from services.emails.sync import EmailService
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+async def create_mailboxes(count: int) -> tuple[int, list[UserEmail]]:
+    now = datetime.now()
+    async with sessionmaker() as session:
+        user = User()
+        session.add(user)
+        await session.flush()
+        mailboxes = [
+            UserEmail(
+                user_id=user.id,
+                email=f"bench-{uuid4().hex[:12]}@gmail.com",
+                provider=ProviderType.google.value,
+                access_token="bench-access-token",
+                refresh_token="bench-refresh-token",
+                expires_at=now + timedelta(days=1),
+                obtained_at=now,
+            )
+            for _ in range(count)
+        ]
+        session.add_all(mailboxes)
+        await session.commit()
+        return user.id, mailboxes
+
+
+async def drop_user(user_id: int) -> None:
+    async with sessionmaker() as session:
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+
+async def sync_once(
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+    user_id: int,
+    mailbox: UserEmail,
+    count: int,
+) -> tuple[float, int, bool]:
+    started = time.perf_counter()
+    async with sessionmaker() as session:
+        email_service = EmailService(
+            session,
+            settings,
+            http_client,
+            UserCache(redis_client, settings),
+            redis_client,
+        )
+        try:
+            result = await email_service.sync_emails_job(
+                EmailSyncData(email=mailbox.email, count=count),
+                user_id,
+            )
+        except ClientError:
+            return time.perf_counter() - started, 0, False
+    return time.perf_counter() - started, result.fetched, True
+
+
+async def run_case(
+    settings: Settings,
+    fake_gmail: FakeGmail,
+    redis_client: redis.Redis,
+    count: int,
+    concurrency: int,
+    rounds: int,
+) -> dict:
+    user_id, mailboxes = await create_mailboxes(concurrency)
+    counter = StatementCounter()
+    event.listen(db_utils.engine.sync_engine, "before_cursor_execute", counter)
+    latencies = []
+    _, parse_started = SYNC_STAGE_SECONDS.total("parse")
+    fetched = 0
+    failures = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(transport=fake_gmail.transport()) as http_client:
+            for _ in range(rounds):
+                fake_gmail.new_generation()
+                results = await asyncio.gather(*(
+                    sync_once(settings, http_client, redis_client, user_id, mailbox, count)
+                    for mailbox in mailboxes
+                ))
+                for latency, messages, ok in results:
+                    latencies.append(latency)
+                    fetched += messages
+                    failures += not ok
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        event.remove(db_utils.engine.sync_engine, "before_cursor_execute", counter)
+        await drop_user(user_id)
+
+    _, parse_finished = SYNC_STAGE_SECONDS.total("parse")
+    latencies.sort()
+    syncs = len(latencies)
+    return {
+        "count": count,
+        "concurrency": concurrency,
+        "syncs": syncs,
+        "failures": failures,
+        "messages_per_s": fetched / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(syncs - 1, int(syncs * 0.99))] * 1000,
+        "statements_per_sync": counter.count / syncs,
+        "peak_memory_mb": peak_memory / 1024 / 1024,
+        "gmail_requests": fake_gmail.stats.requests,
+        # Wire bytes of every Gmail response, list and history calls included.
+        "bytes_per_message": fake_gmail.stats.bytes_sent / fetched if fetched else 0.0,
+        "parse_us_per_message": (parse_finished - parse_started) / fetched * 1e6 if fetched else 0.0,
+    }
+
+
+def print_report(rows: list[dict]) -> None:
+    header = (
+        f"{'count':>6} {'conc':>5} {'syncs':>6} {'fail':>5} {'msg/s':>10} "
+        f"{'p50 ms':>9} {'p99 ms':>9} {'stmts':>7} {'peak MB':>8} {'gmail req':>10} "
+        f"{'B/msg':>7} {'parse us':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['count']:>6} {row['concurrency']:>5} {row['syncs']:>6} "
+            f"{row['failures']:>5} {row['messages_per_s']:>10.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+            f"{row['statements_per_sync']:>7.1f} {row['peak_memory_mb']:>8.2f} "
+            f"{row['gmail_requests']:>10} {row['bytes_per_message']:>7.0f} "
+            f"{row['parse_us_per_message']:>9.1f}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Sync pipeline benchmark against a fake Gmail API and local Postgres.",
+    )
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake Gmail call")
+    parser.add_argument("--unauthorized-every", type=int, default=0, help="answer every Nth call with 401")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth call with 429")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    init_engines(settings)
+    redis_pool = create_redis_pool(settings)
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    rows = []
+    try:
+        for count in args.counts:
+            for concurrency in args.concurrency:
+                fake_gmail = FakeGmail(
+                    latency=args.latency,
+                    unauthorized_every=args.unauthorized_every,
+                    rate_limit_every=args.rate_limit_every,
+                )
+                rows.append(await run_case(
+                    settings, fake_gmail, redis_client, count, concurrency, args.rounds
+                ))
+    finally:
+        await redis_pool.aclose()
+        await dispose_engines()
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import httpx
+import redis.asyncio as redis
+
+import db.utils as db_utils
+from config import Settings
+from db.utils import warm_up_engine
+from metrics import REDIS_COMMAND_SECONDS
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    host_timeouts = {
+        host: httpx.Timeout(timeout, connect=settings.http_connect_timeout)
+        for host, timeout in settings.http_host_timeouts.items()
+    }
+
+    async def apply_host_timeout(request: httpx.Request) -> None:
+        # httpx has no per-host timeouts, the transport reads them from
+        # the request extensions, so override them before sending.
+        timeout = host_timeouts.get(request.url.host)
+        if timeout is not None:
+            request.extensions["timeout"] = timeout.as_dict()
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.http_timeout,
+            connect=settings.http_connect_timeout,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        event_hooks={"request": [apply_host_timeout]},
+    )
+
+
+def create_redis_pool(settings: Settings) -> redis.ConnectionPool:
+    return redis.ConnectionPool.from_url(
+        settings.redis_dsn,
+        max_connections=settings.redis_max_connections,
+        health_check_interval=settings.redis_health_check_interval,
+    )
+
+
+async def warm_up_redis_pool(pool: redis.ConnectionPool, connections: int) -> None:
+    opened = []
+    try:
+        for _ in range(min(connections, pool.max_connections)):
+            opened.append(await pool.get_connection())
+        # One round trip each, so a broken server fails here, not later.
+        await asyncio.gather(*(connection.send_command("PING") for connection in opened))
+        await asyncio.gather(*(connection.read_response() for connection in opened))
+    finally:
+        for connection in opened:
+            await pool.release(connection)
+
+
+async def warm_up_http_client(client: httpx.AsyncClient, urls: list[str]) -> None:
+    # Any response will do, the point is the pooled TCP and TLS session.
+    await asyncio.gather(*(client.head(url) for url in urls))
+
+
+def redis_pool_stats(pool: redis.ConnectionPool) -> dict:
+    # redis-py has no public counters, so read the pool's own bookkeeping.
+    in_use = len(pool._in_use_connections)
+    idle = len(pool._available_connections)
+    return {
+        "max_connections": pool.max_connections,
+        "in_use_connections": in_use,
+        "idle_connections": idle,
+        "created_connections": in_use + idle,
+    }
+
+
+class InstrumentedRedis(redis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - started, str(args[0]))
+
+
+async def warm_up(
+    settings: Settings,
+    redis_pool: redis.ConnectionPool,
+    http_client: httpx.AsyncClient,
+) -> None:
+    engines = [db_utils.engine]
+    if db_utils.read_engine is not db_utils.engine:
+        engines.append(db_utils.read_engine)
+    await asyncio.gather(
+        *(warm_up_engine(engine, settings.postgres_warmup_connections) for engine in engines),
+        warm_up_redis_pool(redis_pool, settings.redis_warmup_connections),
+        warm_up_http_client(http_client, settings.http_warmup_urls),
+    )
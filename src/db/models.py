@@ -1,7 +1,8 @@
 from datetime import datetime
 from enum import StrEnum, auto
 
-from sqlalchemy import ForeignKey, String, UniqueConstraint, func, Index
+from sqlalchemy import ForeignKey, String, UniqueConstraint, func, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -34,6 +35,8 @@ class UserEmail(Base):
     email: Mapped[str] = mapped_column(String(255))
     provider: Mapped[str] = mapped_column(String(50))
     last_synced_at: Mapped[datetime | None]
+    history_id: Mapped[str | None] = mapped_column(String(64))
+    watch_expires_at: Mapped[datetime | None]
 
     access_token: Mapped[str]
     refresh_token: Mapped[str | None]
@@ -49,18 +52,30 @@ class UserEmail(Base):
     )
 
 
+class Sender(Base):
+    __tablename__ = "senders"
+
+    # Lowercased address part of the From header.
+    address: Mapped[str] = mapped_column(String(255), unique=True)
+    display_name: Mapped[str | None] = mapped_column(String(255))
+
+
 class Email(Base):
     __tablename__ = "emails"
 
+    # Part of the primary key, emails is hash partitioned on it.
     user_email_id: Mapped[int] = mapped_column(
-        ForeignKey("user_emails.id", ondelete="CASCADE")
+        ForeignKey("user_emails.id", ondelete="CASCADE"),
+        primary_key=True,
     )
     external_id: Mapped[str] = mapped_column(String(255))
-    from_email: Mapped[str] = mapped_column(String(255))
+    sender_id: Mapped[int] = mapped_column(ForeignKey("senders.id"))
     subject: Mapped[str] = mapped_column(String(511))
     snippet: Mapped[str] = mapped_column(String(511))
     recieved_at: Mapped[datetime]
     is_read: Mapped[bool] = mapped_column(default=False)
+    # Filled by the emails_search_vector_update trigger on insert/update.
+    search_vector: Mapped[str | None] = mapped_column(TSVECTOR, deferred=True)
 
     __table_args__ = (
         UniqueConstraint(
@@ -68,4 +83,87 @@ class Email(Base):
             "external_id",
             name="uq_emails_external_id_user_email_id",
         ),
+        Index(
+            "ix_emails_user_email_id_recieved_at_id",
+            "user_email_id",
+            text("recieved_at DESC"),
+            "id",
+        ),
+        Index(
+            "ix_emails_user_email_id_sender_id_recieved_at_id",
+            "user_email_id",
+            "sender_id",
+            text("recieved_at DESC"),
+            "id",
+        ),
+        Index(
+            "ix_emails_user_email_id_search_vector",
+            "user_email_id",
+            "search_vector",
+            postgresql_using="gin",
+        ),
+        {"postgresql_partition_by": "HASH (user_email_id)"},
+    )
+
+
+class ArchivedEmail(Base):
+    __tablename__ = "emails_archive"
+
+    # Keeps the id the email had in emails.
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    user_email_id: Mapped[int] = mapped_column(
+        ForeignKey("user_emails.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    external_id: Mapped[str] = mapped_column(String(255))
+    sender_id: Mapped[int] = mapped_column(ForeignKey("senders.id"))
+    subject: Mapped[str] = mapped_column(String(511))
+    snippet: Mapped[str] = mapped_column(String(511))
+    recieved_at: Mapped[datetime]
+    is_read: Mapped[bool]
+    archived_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_emails_archive_user_email_id_recieved_at",
+            "user_email_id",
+            "recieved_at",
+        ),
+    )
+
+
+class MailboxStats(Base):
+    __tablename__ = "mailbox_stats"
+
+    user_email_id: Mapped[int] = mapped_column(
+        ForeignKey("user_emails.id", ondelete="CASCADE"),
+        unique=True,
+    )
+    total: Mapped[int] = mapped_column(default=0)
+    unread: Mapped[int] = mapped_column(default=0)
+    newest_recieved_at: Mapped[datetime | None]
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class MailboxSenderStats(Base):
+    __tablename__ = "mailbox_sender_stats"
+
+    user_email_id: Mapped[int] = mapped_column(
+        ForeignKey("user_emails.id", ondelete="CASCADE"),
+    )
+    sender_id: Mapped[int] = mapped_column(ForeignKey("senders.id"))
+    total: Mapped[int] = mapped_column(default=0)
+    unread: Mapped[int] = mapped_column(default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_email_id",
+            "sender_id",
+            name="uq_mailbox_sender_stats_user_email_id_sender_id",
+        ),
+        Index(
+            "ix_mailbox_sender_stats_user_email_id_total",
+            "user_email_id",
+            text("total DESC"),
+        ),
     )
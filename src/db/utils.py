@@ -1,8 +1,153 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import asyncio
+import time
 
-from config import get_settings
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
-settings = get_settings()
+from config import Settings
+from metrics import REGISTRY, CallbackGauge, Counter
 
-engine = create_async_engine(settings.pg_dsn)
-sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+
+def create_engine(dsn: str, settings: Settings) -> AsyncEngine:
+    return create_async_engine(
+        dsn,
+        pool_size=settings.postgres_pool_size,
+        max_overflow=settings.postgres_max_overflow,
+        pool_timeout=settings.postgres_pool_timeout,
+        pool_recycle=settings.postgres_pool_recycle,
+        pool_pre_ping=settings.postgres_pool_pre_ping,
+        connect_args={"timeout": settings.postgres_connect_timeout},
+    )
+
+
+# Engines are created by init_engines() (the app lifespan or a script's
+# main), not at import time. The sessionmakers exist up front and are bound
+# then, so modules can import them before any engine exists.
+engine: AsyncEngine | None = None
+read_engine: AsyncEngine | None = None
+sessionmaker = async_sessionmaker(expire_on_commit=False)
+read_sessionmaker = async_sessionmaker(expire_on_commit=False)
+replica_retry_seconds = 0.0
+# Monotonic time until which reads skip a replica that just failed.
+replica_down_until = 0.0
+
+REPLICA_FALLBACKS = REGISTRY.register(Counter(
+    "db_replica_fallbacks_total",
+    "Read sessions sent to the primary because the replica was unavailable.",
+))
+
+
+def init_engines(settings: Settings) -> AsyncEngine:
+    global engine, read_engine, replica_retry_seconds
+    if engine is not None:
+        return engine
+    engine = create_engine(settings.pg_dsn, settings)
+    # Without a replica, reads simply go to the primary.
+    if settings.postgres_replica_dsn:
+        read_engine = create_engine(settings.postgres_replica_dsn, settings)
+    else:
+        read_engine = engine
+    replica_retry_seconds = settings.postgres_replica_retry_seconds
+    sessionmaker.configure(bind=engine)
+    read_sessionmaker.configure(bind=read_engine)
+    return engine
+
+
+async def dispose_engines() -> None:
+    global engine, read_engine
+    if read_engine is not None and read_engine is not engine:
+        await read_engine.dispose()
+    if engine is not None:
+        await engine.dispose()
+    engine = read_engine = None
+
+
+async def warm_up_engine(target: AsyncEngine, connections: int) -> None:
+    # Opens the connections side by side and hands them back, so they stay
+    # idle in the pool instead of being opened by the first requests.
+    async def open_one():
+        connection = await target.connect()
+        try:
+            await connection.execute(text("SELECT 1"))
+        except BaseException:
+            await connection.close()
+            raise
+        return connection
+
+    opened = await asyncio.gather(
+        *(open_one() for _ in range(min(connections, target.pool.size()))),
+        return_exceptions=True,
+    )
+    for connection in opened:
+        if not isinstance(connection, BaseException):
+            await connection.close()
+    for connection in opened:
+        if isinstance(connection, BaseException):
+            raise connection
+
+
+async def open_read_session() -> AsyncSession:
+    global replica_down_until
+    if read_engine is engine:
+        return sessionmaker()
+    if replica_down_until > time.monotonic():
+        REPLICA_FALLBACKS.inc()
+        return sessionmaker()
+
+    session = read_sessionmaker()
+    try:
+        # Checks a replica connection out now, so an unreachable replica
+        # falls back here instead of failing the first query.
+        await session.connection()
+    except (DBAPIError, OSError, TimeoutError, PoolTimeoutError):
+        await session.close()
+        replica_down_until = time.monotonic() + replica_retry_seconds
+        REPLICA_FALLBACKS.inc()
+        return sessionmaker()
+    return session
+
+
+# Read session that is opened, and the replica probed, on first use, so
+# requests that never read from it don't hold a replica connection.
+class LazyReadSession:
+    def __init__(self):
+        self._session: AsyncSession | None = None
+
+    async def get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = await open_read_session()
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def replica_pool() -> Pool | None:
+    return read_engine.pool if read_engine is not engine else None
+
+
+REGISTRY.register(CallbackGauge(
+    "db_pool_checked_out",
+    "SQLAlchemy pool connections currently checked out.",
+    lambda: engine.pool.checkedout() if engine else None,
+))
+REGISTRY.register(CallbackGauge(
+    "db_pool_overflow",
+    "SQLAlchemy pool connections open beyond pool_size.",
+    lambda: engine.pool.overflow() if engine else None,
+))
+REGISTRY.register(CallbackGauge(
+    "db_replica_pool_checked_out",
+    "SQLAlchemy replica pool connections currently checked out.",
+    lambda: pool.checkedout() if (pool := replica_pool()) else None,
+))
+REGISTRY.register(CallbackGauge(
+    "db_replica_pool_overflow",
+    "SQLAlchemy replica pool connections open beyond pool_size.",
+    lambda: pool.overflow() if (pool := replica_pool()) else None,
+))
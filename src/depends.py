@@ -1,17 +1,22 @@
 from typing import Annotated, AsyncGenerator
 
+import httpx
 import redis.asyncio as redis
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from clients import InstrumentedRedis
 from config import Settings, get_settings
 from db.models import ProviderType
-from db.utils import sessionmaker
+from db.utils import LazyReadSession, open_read_session, sessionmaker
+from services.auth.cache import UserCache
 from services.auth.dtos import UserOut
 from services.auth.callback import OAuthCallbackService, get_oauth_provider
 from services.auth.providers.base import OAuthProvider
 from services.auth.tokens import AuthService
+from services.emails.jobs import EmailActionJobQueue, SyncJobQueue
+from services.emails.push import GmailPushService
 from services.emails.sync import EmailService
 
 
@@ -20,25 +25,41 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
-async def get_redis_client(
-    settings: Annotated[Settings, Depends(get_settings)],
-) -> AsyncGenerator[redis.Redis, None]:
-    redis_client = redis.Redis.from_url(settings.redis_dsn)
+async def get_read_session() -> AsyncGenerator[LazyReadSession, None]:
+    read_session = LazyReadSession()
     try:
-        yield redis_client
+        yield read_session
     finally:
-        await redis_client.close()
+        await read_session.close()
+
+
+async def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
+
+
+async def get_redis_client(request: Request) -> redis.Redis:
+    return InstrumentedRedis(connection_pool=request.app.state.redis_pool)
+
+
+async def get_user_cache(
+    settings: Annotated[Settings, Depends(get_settings)],
+    redis: Annotated[redis.Redis, Depends(get_redis_client)],
+) -> UserCache:
+    return UserCache(redis, settings)
 
 
 async def get_token_service(
     settings: Annotated[Settings, Depends(get_settings)],
     redis: Annotated[redis.Redis, Depends(get_redis_client)],
     session: Annotated[AsyncSession, Depends(get_session)],
+    user_cache: Annotated[UserCache, Depends(get_user_cache)],
 ):
     return AuthService(
         secret_key=settings.secret_key,
         redis=redis,
         session=session,
+        user_cache=user_cache,
+        open_read_session=open_read_session,
     )
 
 
@@ -52,8 +73,9 @@ async def get_current_user(
 async def get_oauth_service(
     provider: ProviderType,
     settings: Annotated[Settings, Depends(get_settings)],
+    http_client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
 ) -> OAuthProvider:
-    return get_oauth_provider(provider, settings)
+    return get_oauth_provider(provider, settings, http_client)
 
 
 async def get_oauth_callback_service(
@@ -61,17 +83,50 @@ async def get_oauth_callback_service(
     settings: Annotated[Settings, Depends(get_settings)],
     redis: Annotated[redis.Redis, Depends(get_redis_client)],
     session: Annotated[AsyncSession, Depends(get_session)],
+    http_client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+    user_cache: Annotated[UserCache, Depends(get_user_cache)],
 ) -> OAuthCallbackService:
-    oauth_provider = get_oauth_provider(provider, settings)
+    oauth_provider = get_oauth_provider(provider, settings, http_client)
     return OAuthCallbackService(
         provider=oauth_provider,
         session=session,
         redis=redis,
+        user_cache=user_cache,
     )
 
 
 async def get_email_service(
     session: Annotated[AsyncSession, Depends(get_session)],
+    read_session: Annotated[LazyReadSession, Depends(get_read_session)],
     settings: Annotated[Settings, Depends(get_settings)],
+    http_client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+    user_cache: Annotated[UserCache, Depends(get_user_cache)],
+    redis: Annotated[redis.Redis, Depends(get_redis_client)],
 ) -> EmailService:
-    return EmailService(session, settings)
+    return EmailService(
+        session, settings, http_client, user_cache, redis, read_session=read_session
+    )
+
+
+async def get_sync_job_queue(
+    settings: Annotated[Settings, Depends(get_settings)],
+    redis: Annotated[redis.Redis, Depends(get_redis_client)],
+) -> SyncJobQueue:
+    return SyncJobQueue(redis, settings)
+
+
+async def get_action_job_queue(
+    settings: Annotated[Settings, Depends(get_settings)],
+    redis: Annotated[redis.Redis, Depends(get_redis_client)],
+) -> EmailActionJobQueue:
+    return EmailActionJobQueue(redis, settings)
+
+
+async def get_gmail_push_service(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[redis.Redis, Depends(get_redis_client)],
+    queue: Annotated[SyncJobQueue, Depends(get_sync_job_queue)],
+    settings: Annotated[Settings, Depends(get_settings)],
+    http_client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+) -> GmailPushService:
+    return GmailPushService(session, redis, queue, settings, http_client)
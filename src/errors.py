@@ -4,3 +4,7 @@ class ClientError(ValueError):
 
 class EmailAuthError(RuntimeError):
     pass
+
+
+class EmailHistoryExpiredError(RuntimeError):
+    pass
@@ -1,13 +1,52 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 
 from api.auth import router as auth_router
 from api.emails import router as emails_router
+from api.health import router as health_router
+from api.metrics import router as metrics_router
+from api.webhooks import router as webhooks_router
+from clients import create_http_client, create_redis_pool, warm_up
+from config import get_settings
+from db.utils import dispose_engines, init_engines
 from errors import ClientError
 
-app = FastAPI(title="Template emails backend")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    init_engines(settings)
+    redis_pool = create_redis_pool(settings)
+    async with create_http_client(settings) as http_client:
+        app.state.http_client = http_client
+        app.state.redis_pool = redis_pool
+        # Uvicorn accepts requests only after this returns, so the first
+        # ones find open connections. A failed warm-up doesn't stop the
+        # app, /health/ready keeps answering 503 and retrying instead.
+        app.state.ready = False
+        try:
+            await warm_up(settings, redis_pool, http_client)
+            app.state.ready = True
+        except Exception:
+            logger.exception("Warm-up failed")
+        try:
+            yield
+        finally:
+            await redis_pool.aclose()
+            await dispose_engines()
+
+
+app = FastAPI(title="Template emails backend", lifespan=lifespan)
 app.include_router(auth_router)
 app.include_router(emails_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
+app.include_router(webhooks_router)
 
 
 @app.exception_handler(ClientError)
@@ -0,0 +1,216 @@
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+
+# Minimal in-process metrics rendered in the Prometheus text format.
+# Everything runs on the event loop thread, so updates are plain dict
+# operations without locks; label values are passed positionally.
+
+SHARED_METRICS_KEY_PREFIX = "metrics:"
+LABEL_SEPARATOR = "\x1f"
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+# Counter for work that also runs in the worker and the scripts, which have
+# no /metrics of their own. Increments are kept until flush() adds them to
+# a Redis hash, and the API renders the totals of that hash, so every
+# process is counted.
+class SharedCounter(Counter):
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.key = SHARED_METRICS_KEY_PREFIX + name
+        self._pending: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._pending[labels] = self._pending.get(labels, 0) + amount
+
+    async def flush(self, redis) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for labels, amount in pending.items():
+                    pipe.hincrbyfloat(self.key, LABEL_SEPARATOR.join(labels), amount)
+                await pipe.execute()
+        except BaseException:
+            # Kept for the next flush.
+            for labels, amount in pending.items():
+                self._pending[labels] = self._pending.get(labels, 0) + amount
+            raise
+
+    async def load(self, redis) -> None:
+        raw = await redis.hgetall(self.key)
+        self._values = {
+            tuple(key.decode().split(LABEL_SEPARATOR)) if self.labelnames else (): float(value)
+            for key, value in raw.items()
+        }
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label set: [bucket counts..., +Inf count, sum].
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def total(self, *labels: str) -> tuple[int, float]:
+        counts = self._values.get(labels)
+        if counts is None:
+            return 0, 0.0
+        return sum(counts[:-1]), counts[-1]
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_str = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_str} {counts[-1]}"
+            yield f"{self.name}_count{label_str} {cumulative}"
+
+
+class CallbackGauge:
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], float | None],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self) -> Iterable[str]:
+        value = self.callback()
+        if value is not None:
+            yield f"{self.name} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | CallbackGauge] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    async def flush_shared(self, redis) -> None:
+        for metric in self._metrics.values():
+            if isinstance(metric, SharedCounter):
+                await metric.flush(redis)
+
+    async def load_shared(self, redis) -> None:
+        for metric in self._metrics.values():
+            if isinstance(metric, SharedCounter):
+                await metric.load(redis)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SYNC_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "email_sync_stage_seconds",
+    "Time spent in each stage of a mailbox sync.",
+    ("stage",),
+))
+SYNC_UNAUTHORIZED_REFRESHES = REGISTRY.register(SharedCounter(
+    "email_sync_unauthorized_refreshes_total",
+    "Token refreshes triggered by a 401 from the email provider.",
+))
+SYNC_EMAILS = REGISTRY.register(SharedCounter(
+    "email_sync_emails_total",
+    "Fetched emails by what the save step did with them.",
+    ("result",),
+))
+GMAIL_THROTTLED = REGISTRY.register(Counter(
+    "gmail_throttled_responses_total",
+    "Gmail responses that signalled a rate limit, by call and status.",
+    ("call", "status"),
+))
+GMAIL_LIMITER_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "gmail_limiter_wait_seconds",
+    "Time Gmail calls waited for quota or a throttling pause.",
+))
+EMAIL_RETENTION_ROWS = REGISTRY.register(SharedCounter(
+    "email_retention_rows_total",
+    "Emails removed by the retention job, by action.",
+    ("action",),
+))
+GMAIL_MESSAGE_BYTES = REGISTRY.register(Histogram(
+    "gmail_message_bytes",
+    "Bytes downloaded per fetched Gmail message, before decompression. "
+    "Batch requests record one sample per batch, the average per message.",
+    ("source",),
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 65536),
+))
+REDIS_COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "redis_command_seconds",
+    "Redis command round trip time.",
+    ("command",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+))
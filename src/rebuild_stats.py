@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from config import get_settings
+from db.models import UserEmail
+from db.utils import dispose_engines, init_engines, sessionmaker
+from services.emails.stats import RebuildMailboxStats
+
+logger = logging.getLogger("rebuild_stats")
+
+
+async def rebuild_mailbox(user_email_id: int) -> None:
+    async with sessionmaker() as session:
+        await RebuildMailboxStats(session).execute(user_email_id)
+        await session.commit()
+
+
+async def rebuild_mailboxes(emails: list[str]) -> None:
+    stmt = select(UserEmail.id, UserEmail.email).order_by(UserEmail.id)
+    if emails:
+        stmt = stmt.where(UserEmail.email.in_([email.lower() for email in emails]))
+    async with sessionmaker() as session:
+        mailboxes = list(await session.execute(stmt))
+
+    # One transaction per mailbox, so syncs of other mailboxes never wait.
+    for user_email_id, email in mailboxes:
+        try:
+            await rebuild_mailbox(user_email_id)
+            logger.info("Rebuilt stats of %s", email)
+        except Exception:
+            logger.exception("Rebuilding stats of %s crashed", email)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Recount mailbox stats from the emails table.")
+    parser.add_argument("emails", nargs="*", help="mailboxes to rebuild, all by default")
+    args = parser.parse_args()
+
+    init_engines(get_settings())
+    try:
+        await rebuild_mailboxes(args.emails)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,19 @@
+from importlib import import_module
+
+
+# Maps names to "module:attribute" paths and imports each module on first
+# use, so startup doesn't pay for providers that are never called.
+class LazyRegistry:
+    def __init__(self, paths: dict[str, str]):
+        self.paths = paths
+        self._loaded = {}
+
+    def get(self, name: str):
+        loaded = self._loaded.get(name)
+        if loaded is None:
+            module_name, attribute = self.paths[name].split(":")
+            loaded = self._loaded[name] = getattr(import_module(module_name), attribute)
+        return loaded
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.paths
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from clients import create_redis_pool
+from config import Settings, get_settings
+from db.models import UserEmail
+from db.utils import dispose_engines, init_engines, sessionmaker
+from metrics import EMAIL_RETENTION_ROWS, REGISTRY
+from services.emails.crud import PruneEmails
+
+logger = logging.getLogger("retention")
+
+
+async def prune_mailbox(user_email_id: int, older_than: datetime, settings: Settings) -> int:
+    action = "archived" if settings.email_retention_archive else "deleted"
+    total = 0
+    async with sessionmaker() as session:
+        prune = PruneEmails(
+            session,
+            batch_size=settings.email_retention_batch_size,
+            archive=settings.email_retention_archive,
+        )
+        while True:
+            # Commit per batch, so row locks and the WAL burst stay small
+            # and autovacuum and replicas can keep up between batches.
+            removed = await prune.execute(user_email_id, older_than)
+            await session.commit()
+            total += removed
+            EMAIL_RETENTION_ROWS.inc(action, amount=removed)
+            if removed < settings.email_retention_batch_size:
+                return total
+            await asyncio.sleep(settings.email_retention_batch_pause_seconds)
+
+
+async def prune_emails(settings: Settings) -> None:
+    # recieved_at is stored as naive UTC.
+    older_than = datetime.now(UTC).replace(tzinfo=None) \
+        - timedelta(days=settings.email_retention_days)
+    async with sessionmaker() as session:
+        result = await session.execute(select(UserEmail.id).order_by(UserEmail.id))
+        mailbox_ids = list(result.scalars())
+
+    total = 0
+    for user_email_id in mailbox_ids:
+        try:
+            total += await prune_mailbox(user_email_id, older_than, settings)
+        except Exception:
+            logger.exception("Pruning mailbox %s crashed", user_email_id)
+    logger.info("Pruned %s emails received before %s", total, older_than)
+
+
+async def main() -> None:
+    settings = get_settings()
+    if settings.email_retention_days is None:
+        raise SystemExit("EMAIL_RETENTION_DAYS is not configured.")
+
+    init_engines(settings)
+    redis_pool = create_redis_pool(settings)
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    try:
+        while True:
+            await prune_emails(settings)
+            # email_retention_rows_total is exported by the API's /metrics.
+            try:
+                await REGISTRY.flush_shared(redis_client)
+            except redis.RedisError:
+                logger.warning("Could not flush metrics", exc_info=True)
+            await asyncio.sleep(settings.email_retention_interval_seconds)
+    finally:
+        await redis_pool.aclose()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+from functools import cache
+
+import redis.asyncio as redis
+
+from cache import TTLCache
+from config import Settings
+from services.auth.dtos import UserOut
+
+USER_CACHE_KEY_PREFIX = "user:"
+USER_INVALIDATED_KEY_PREFIX = "user:invalidated:"
+USER_VERSION_KEY_PREFIX = "user:version:"
+# Writes the user only if no invalidation bumped the version since it was
+# read, so a user loaded before an invalidation can't be cached after it.
+SET_IF_VERSION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+@cache
+def get_local_user_cache(max_size: int, ttl: float) -> TTLCache:
+    return TTLCache(max_size=max_size, ttl=ttl)
+
+
+# Resolved users keyed by the JWT subject email. The in-process tier is only
+# invalidated in the current process, so its TTL is kept short; the Redis
+# tier is shared by all workers.
+class UserCache:
+    def __init__(self, redis: redis.Redis, settings: Settings):
+        self.redis = redis
+        self.ttl = settings.user_cache_ttl_seconds
+        self.primary_read_seconds = settings.user_cache_primary_read_seconds
+        self.set_if_version = redis.register_script(SET_IF_VERSION_SCRIPT)
+        self.local = get_local_user_cache(
+            settings.user_cache_local_max_size,
+            settings.user_cache_local_ttl_seconds,
+        )
+
+    async def get(self, email: str) -> UserOut | None:
+        user = self.local.get(email)
+        if user is not None:
+            return user
+
+        raw = await self.redis.get(USER_CACHE_KEY_PREFIX + email)
+        if raw is None:
+            return None
+        user = UserOut.model_validate_json(raw)
+        self.local.set(email, user)
+        return user
+
+    async def get_version(self, email: str) -> tuple[str, bool]:
+        # The version to pass to set() and whether the user was invalidated
+        # recently enough that the replica may still have the old row.
+        version, invalidated = await self.redis.mget(
+            USER_VERSION_KEY_PREFIX + email,
+            USER_INVALIDATED_KEY_PREFIX + email,
+        )
+        return (version or b"").decode(), invalidated is not None
+
+    async def set(self, email: str, user: UserOut, version: str) -> None:
+        stored = await self.set_if_version(
+            keys=[USER_CACHE_KEY_PREFIX + email, USER_VERSION_KEY_PREFIX + email],
+            args=[user.model_dump_json(), self.ttl, version],
+        )
+        if stored:
+            self.local.set(email, user)
+
+    async def invalidate(self, emails: list[str]) -> None:
+        if not emails:
+            return
+        for email in emails:
+            self.local.pop(email)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*(USER_CACHE_KEY_PREFIX + email for email in emails))
+            for email in emails:
+                pipe.set(USER_INVALIDATED_KEY_PREFIX + email, 1, ex=self.primary_read_seconds)
+                # Outlives any cache entry, so a stale fill is always caught.
+                pipe.incr(USER_VERSION_KEY_PREFIX + email)
+                pipe.expire(USER_VERSION_KEY_PREFIX + email, self.ttl * 2)
+            await pipe.execute()
@@ -1,14 +1,12 @@
+import httpx
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import Settings
+from services.auth.cache import UserCache
 from services.auth.crud import CreateUser
+from services.auth.providers import OAUTH_PROVIDERS
 from services.auth.providers.base import OAuthProvider
-from services.auth.providers.google import GoogleOAuthProvider
-
-_PROVIDER_REGISTRY = {
-    "google": GoogleOAuthProvider,
-}
 
 
 class OAuthCallbackService:
@@ -17,14 +15,16 @@ class OAuthCallbackService:
         provider: OAuthProvider,
         session: AsyncSession,
         redis: redis.Redis,
+        user_cache: UserCache,
     ):
         self.provider = provider
         self.session = session
         self.redis = redis
+        self.user_cache = user_cache
 
     async def handle_callback(self, code: str, state: str) -> str:
         user_info, tokens = await self.provider.handle_callback(code)
-        await CreateUser(self.session).execute(user_info["email"], tokens)
+        await CreateUser(self.session, self.user_cache).execute(user_info["email"], tokens)
         await self.redis.setex(
             state,
             self.provider.STATE_EXPIRATION_SECONDS,
@@ -36,5 +36,6 @@ class OAuthCallbackService:
 def get_oauth_provider(
     provider_name: str,
     settings: Settings,
+    client: httpx.AsyncClient,
 ) -> OAuthProvider:
-    return _PROVIDER_REGISTRY[provider_name](settings)
+    return OAUTH_PROVIDERS.get(provider_name)(settings, client)
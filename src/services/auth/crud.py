@@ -3,12 +3,14 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models import ProviderType, User, UserEmail
+from services.auth.cache import UserCache
 from services.auth.dtos import OAuthTokens
 
 
 class CreateUser:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, user_cache: UserCache):
         self.session = session
+        self.user_cache = user_cache
 
     async def execute(self, email: str, tokens: OAuthTokens) -> None:
         stmt = select(UserEmail).where(UserEmail.email == email.lower())
@@ -22,6 +24,7 @@ class CreateUser:
             user_obj.expires_at = now + timedelta(seconds=tokens.expires_in)
             user_obj.obtained_at = now
             await self.session.commit()
+            await self.user_cache.invalidate([user_obj.email])
             return
 
         user = User()
@@ -45,3 +48,4 @@ class CreateUser:
         )
         self.session.add(user_email)
         await self.session.commit()
+        await self.user_cache.invalidate([email])
@@ -14,9 +14,13 @@ class UserOut(BaseModel):
     emails: list[UserEmailOut]
 
 
-class EmailSyncData(BaseModel):
-    email: str
+class EmailSyncAllData(BaseModel):
     count: int = 10
+    incremental: bool = False
+
+
+class EmailSyncData(EmailSyncAllData):
+    email: str
 
 
 class GenerateTokenData(BaseModel):
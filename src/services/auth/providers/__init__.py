@@ -0,0 +1,6 @@
+from db.models import ProviderType
+from registry import LazyRegistry
+
+OAUTH_PROVIDERS = LazyRegistry({
+    ProviderType.google: "services.auth.providers.google:GoogleOAuthProvider",
+})
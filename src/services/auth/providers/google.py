@@ -8,8 +8,9 @@ from services.auth.providers.base import OAuthProvider
 
 
 class GoogleOAuthProvider(OAuthProvider):
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, client: httpx.AsyncClient):
         self.settings = settings
+        self.client = client
 
     async def get_auth_url(self) -> str:
         state = secrets.token_urlsafe(16)
@@ -31,19 +32,18 @@ class GoogleOAuthProvider(OAuthProvider):
         return user_info, tokens
 
     async def refresh_token(self, refresh_token: str) -> OAuthTokens:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.settings.google_token_url,
-                data={
-                    "client_id": self.settings.google_client_id,
-                    "client_secret": self.settings.google_client_secret,
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token",
-                },
-                headers={
-                    "Content-Type": "application/x-www-form-urlencoded"
-                },
-            )
+        response = await self.client.post(
+            self.settings.google_token_url,
+            data={
+                "client_id": self.settings.google_client_id,
+                "client_secret": self.settings.google_client_secret,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+            },
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded"
+            },
+        )
         response.raise_for_status()
         response_data = response.json()
         return OAuthTokens(
@@ -53,20 +53,19 @@ class GoogleOAuthProvider(OAuthProvider):
         )
 
     async def _exchange_code(self, code: str) -> OAuthTokens:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.settings.google_token_url,
-                data={
-                    "client_id": self.settings.google_client_id,
-                    "client_secret": self.settings.google_client_secret,
-                    "code": code,
-                    "grant_type": "authorization_code",
-                    "redirect_uri": self.settings.google_redirect_uri,
-                },
-                headers={
-                    "Content-Type": "application/x-www-form-urlencoded"
-                },
-            )
+        response = await self.client.post(
+            self.settings.google_token_url,
+            data={
+                "client_id": self.settings.google_client_id,
+                "client_secret": self.settings.google_client_secret,
+                "code": code,
+                "grant_type": "authorization_code",
+                "redirect_uri": self.settings.google_redirect_uri,
+            },
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded"
+            },
+        )
         response.raise_for_status()
         response_data = response.json()
         return OAuthTokens(
@@ -76,13 +75,12 @@ class GoogleOAuthProvider(OAuthProvider):
         )
 
     async def _get_user_info(self, access_token: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://openidconnect.googleapis.com/v1/userinfo",
-                headers={
-                    "Authorization": f"Bearer {access_token}"
-                },
-            )
+        response = await self.client.get(
+            "https://openidconnect.googleapis.com/v1/userinfo",
+            headers={
+                "Authorization": f"Bearer {access_token}"
+            },
+        )
 
         response.raise_for_status()
         return response.json()
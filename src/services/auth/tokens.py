@@ -1,3 +1,4 @@
+from collections.abc import Awaitable, Callable
 from datetime import datetime, timedelta
 
 import jwt
@@ -7,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models import UserEmail
 from errors import ClientError
+from services.auth.cache import UserCache
 from services.auth.dtos import GenerateTokenData, UserOut
 
 ACCESS_TOKEN_EXPIRES_IN_MINUTES = 15
@@ -15,10 +17,21 @@ JWT_ALGORITHM = "HS256"
 
 class AuthService:
 
-    def __init__(self, secret_key: str, redis: redis.Redis, session: AsyncSession):
+    def __init__(
+        self,
+        secret_key: str,
+        redis: redis.Redis,
+        session: AsyncSession,
+        user_cache: UserCache,
+        open_read_session: Callable[[], Awaitable[AsyncSession]] | None = None,
+    ):
         self.session = session
+        # Opened only when the user isn't cached, so cache hits don't check
+        # out a replica connection.
+        self.open_read_session = open_read_session
         self.secret_key = secret_key
         self.redis = redis
+        self.user_cache = user_cache
 
     async def issue_access_token(self, data: GenerateTokenData) -> dict:
         email = await self.redis.get(data.state)
@@ -36,7 +49,15 @@ class AuthService:
     async def get_current_user(self, token: str) -> UserOut:
         payload = await self._decode_access_token(token)
         email = payload["sub"]
-        return await self._get_user(email)
+        user = await self.user_cache.get(email)
+        if user is None:
+            # Right after an invalidation the replica may still return the
+            # old row, read the primary then. The version read before the
+            # load keeps a concurrent invalidation from being overwritten.
+            version, from_primary = await self.user_cache.get_version(email)
+            user = await self._get_user(email, from_primary)
+            await self.user_cache.set(email, user, version)
+        return user
 
     async def _decode_access_token(self, token: str) -> dict:
         try:
@@ -55,7 +76,19 @@ class AuthService:
             raise ClientError("User not found in database")
         return user_obj
 
-    async def _get_user(self, email: str) -> UserOut:
+    async def _get_user(self, email: str, from_primary: bool = False) -> UserOut:
+        user = None
+        if self.open_read_session is not None and not from_primary:
+            async with await self.open_read_session() as read_session:
+                user = await self._select_user(read_session, email)
+        # A user created moments ago may not have reached the replica yet.
+        if user is None:
+            user = await self._select_user(self.session, email)
+        if user is None:
+            raise ClientError("User not found in database")
+        return user
+
+    async def _select_user(self, session: AsyncSession, email: str) -> UserOut | None:
         sql = """
         SELECT ue.user_id AS id, array_agg(
             jsonb_build_object(
@@ -72,5 +105,6 @@ class AuthService:
         )
         GROUP BY ue.user_id
         """
-        result = await self.session.execute(text(sql), {"email": email})
-        return UserOut(**result.mappings().first())
+        result = await session.execute(text(sql), {"email": email})
+        row = result.mappings().first()
+        return UserOut(**row) if row else None
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+from collections.abc import Awaitable, Callable
+from functools import cache, partial
+from typing import Any
+
+import redis.asyncio as redis
+
+from cache import SizedLRUCache
+from config import Settings
+
+EMAIL_CONTENT_REF_KEY_PREFIX = "email:content:"
+EMAIL_CONTENT_BLOB_KEY_PREFIX = "email:blob:"
+
+
+# Concurrent calls with the same key share one in-flight call. It runs in its
+# own task that no caller owns, so any caller, the first one included, can
+# be cancelled without failing the others.
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Any, asyncio.Task] = {}
+
+    async def do(self, key: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(call())
+            self._calls[key] = task
+            task.add_done_callback(partial(self._done, key))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Any, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Marks the exception as retrieved when every caller went away.
+        if not task.cancelled():
+            task.exception()
+
+
+@cache
+def get_local_content_cache(max_bytes: int) -> SizedLRUCache:
+    return SizedLRUCache(max_bytes=max_bytes)
+
+
+@cache
+def get_content_single_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+# Message content keyed by (user_email_id, external_id). Redis keeps a small
+# per-message ref to a blob named by the sha256 of the content, so the same
+# message synced into several mailboxes is stored once.
+class EmailContentCache:
+    def __init__(self, redis: redis.Redis, settings: Settings):
+        self.redis = redis
+        self.ttl = settings.email_content_cache_ttl_seconds
+        self.local = get_local_content_cache(settings.email_content_local_max_bytes)
+        self.single_flight = get_content_single_flight()
+
+    async def get_or_fetch(
+        self,
+        user_email_id: int,
+        external_id: str,
+        fetch: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        key = (user_email_id, external_id)
+        content = self.local.get(key)
+        if content is not None:
+            return content
+
+        async def load() -> bytes:
+            content = await self._get_shared(user_email_id, external_id)
+            if content is None:
+                content = await fetch()
+                await self._set_shared(user_email_id, external_id, content)
+            self.local.set(key, content)
+            return content
+
+        return await self.single_flight.do(key, load)
+
+    async def _get_shared(self, user_email_id: int, external_id: str) -> bytes | None:
+        digest = await self.redis.get(self._ref_key(user_email_id, external_id))
+        if digest is None:
+            return None
+        return await self.redis.get(EMAIL_CONTENT_BLOB_KEY_PREFIX + digest.decode())
+
+    async def _set_shared(self, user_email_id: int, external_id: str, content: bytes) -> None:
+        digest = hashlib.sha256(content).hexdigest()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(EMAIL_CONTENT_BLOB_KEY_PREFIX + digest, content, ex=self.ttl)
+            pipe.set(self._ref_key(user_email_id, external_id), digest, ex=self.ttl)
+            await pipe.execute()
+
+    @staticmethod
+    def _ref_key(user_email_id: int, external_id: str) -> str:
+        return f"{EMAIL_CONTENT_REF_KEY_PREFIX}{user_email_id}:{external_id}"
@@ -0,0 +1,208 @@
+from datetime import datetime
+
+from sqlalchemy import column, delete, literal_column, select, table, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import ArchivedEmail, Email
+from services.emails.dtos import EmailAction, FetchedEmail, SaveEmailsResult
+from services.emails.senders import SenderResolver
+from services.emails.stats import ApplyMailboxStats, MailboxStatsDelta
+
+EMAIL_COLUMNS = (
+    "user_email_id",
+    "external_id",
+    "sender_id",
+    "subject",
+    "snippet",
+    "recieved_at",
+    "is_read",
+)
+EMAIL_IMPORT_TABLE = "emails_import"
+ARCHIVE_COLUMNS = ("id", *EMAIL_COLUMNS, "created_at")
+
+
+class UpsertEmails:
+    def __init__(
+        self,
+        session: AsyncSession,
+        senders: SenderResolver,
+        batch_size: int = 1000,
+        copy_threshold: int = 5000,
+    ):
+        self.session = session
+        self.senders = senders
+        self.batch_size = batch_size
+        self.copy_threshold = copy_threshold
+
+    async def execute(self, emails: list[FetchedEmail]) -> SaveEmailsResult:
+        result = SaveEmailsResult()
+        if not emails:
+            return result
+
+        sender_ids = await self.senders.resolve({
+            email.from_email: email.from_name for email in emails
+        })
+        # One statement can't touch the same row twice, keep the last copy.
+        rows = list({
+            (email.user_email_id, email.external_id): {
+                "user_email_id": email.user_email_id,
+                "external_id": email.external_id,
+                "sender_id": sender_ids[email.from_email],
+                "subject": email.subject,
+                "snippet": email.snippet,
+                "recieved_at": email.recieved_at,
+                "is_read": email.is_read,
+            }
+            for email in emails
+        }.values())
+
+        if len(rows) >= self.copy_threshold:
+            changed = await self._copy(rows)
+        else:
+            changed = []
+            for start in range(0, len(rows), self.batch_size):
+                changed.extend(
+                    await self._upsert(rows[start:start + self.batch_size])
+                )
+
+        # Stats move in the same transaction as the rows they describe. An
+        # update only ever flips is_read, so it shifts the unread counters.
+        delta = MailboxStatsDelta()
+        for row in changed:
+            unread = 0 if row.is_read else 1
+            if row.inserted:
+                result.inserted += 1
+                delta.add(row.user_email_id, row.sender_id, 1, unread, row.recieved_at)
+            else:
+                result.updated += 1
+                delta.add(row.user_email_id, row.sender_id, 0, 2 * unread - 1)
+        await ApplyMailboxStats(self.session).execute(delta)
+        return result
+
+    async def _upsert(self, rows: list[dict]) -> list:
+        stmt = self._on_conflict(insert(Email).values(rows))
+        result = await self.session.execute(stmt)
+        return list(result)
+
+    async def _copy(self, rows: list[dict]) -> list:
+        await self.session.execute(text(
+            f"CREATE TEMP TABLE {EMAIL_IMPORT_TABLE} ON COMMIT DROP AS "
+            f"SELECT {', '.join(EMAIL_COLUMNS)} FROM emails WITH NO DATA"
+        ))
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            EMAIL_IMPORT_TABLE,
+            records=[tuple(row[name] for name in EMAIL_COLUMNS) for row in rows],
+            columns=EMAIL_COLUMNS,
+        )
+
+        import_table = table(
+            EMAIL_IMPORT_TABLE, *(column(name) for name in EMAIL_COLUMNS)
+        )
+        stmt = self._on_conflict(
+            insert(Email).from_select(EMAIL_COLUMNS, select(import_table))
+        )
+        result = await self.session.execute(stmt)
+        return list(result)
+
+    def _on_conflict(self, stmt):
+        # xmax is 0 only for freshly inserted tuples, which tells inserts
+        # apart from updates. Rows whose is_read didn't change are skipped.
+        return stmt.on_conflict_do_update(
+            constraint="uq_emails_external_id_user_email_id",
+            set_={"is_read": stmt.excluded.is_read},
+            where=Email.is_read.is_distinct_from(stmt.excluded.is_read),
+        ).returning(
+            literal_column("xmax = 0").label("inserted"),
+            Email.user_email_id,
+            Email.sender_id,
+            Email.recieved_at,
+            Email.is_read,
+        )
+
+
+class PruneEmails:
+    def __init__(
+        self,
+        session: AsyncSession,
+        batch_size: int = 1000,
+        archive: bool = False,
+    ):
+        self.session = session
+        self.batch_size = batch_size
+        self.archive = archive
+
+    async def execute(self, user_email_id: int, older_than: datetime) -> int:
+        # One batch of the oldest rows of one mailbox: a range scan of
+        # ix_emails_user_email_id_recieved_at_id inside a single partition.
+        # Rows locked by a concurrent sync are left for the next run.
+        batch = select(Email.id).where(
+            Email.user_email_id == user_email_id,
+            Email.recieved_at < older_than,
+        ).order_by(Email.recieved_at).limit(self.batch_size) \
+            .with_for_update(skip_locked=True)
+        stmt = delete(Email).where(
+            Email.user_email_id == user_email_id,
+            Email.id.in_(batch.scalar_subquery()),
+        )
+
+        if not self.archive:
+            stmt = stmt.returning(
+                Email.user_email_id, Email.sender_id, Email.is_read, Email.recieved_at
+            )
+        else:
+            moved = stmt.returning(*(
+                getattr(Email, name) for name in ARCHIVE_COLUMNS
+            )).cte("moved")
+            stmt = insert(ArchivedEmail).from_select(ARCHIVE_COLUMNS, select(moved)) \
+                .returning(
+                    ArchivedEmail.user_email_id,
+                    ArchivedEmail.sender_id,
+                    ArchivedEmail.is_read,
+                    ArchivedEmail.recieved_at,
+                )
+        removed = list(await self.session.execute(stmt))
+
+        delta = MailboxStatsDelta()
+        for row in removed:
+            delta.remove(row.user_email_id, row.sender_id, row.is_read, row.recieved_at)
+        await ApplyMailboxStats(self.session).execute(delta)
+        return len(removed)
+
+
+class ApplyEmailAction:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def execute(
+        self,
+        user_email_id: int,
+        action: EmailAction,
+        email_ids: list[int],
+    ) -> int:
+        # One set-based statement per chunk. Archiving only moves the Gmail
+        # label, and labels aren't stored locally, so it changes no rows.
+        where = (Email.user_email_id == user_email_id, Email.id.in_(email_ids))
+        if action == EmailAction.trash:
+            stmt = delete(Email).where(*where).returning(
+                Email.user_email_id, Email.sender_id, Email.is_read, Email.recieved_at
+            )
+        elif action in (EmailAction.mark_read, EmailAction.mark_unread):
+            is_read = action == EmailAction.mark_read
+            stmt = update(Email).where(*where, Email.is_read.is_not(is_read)) \
+                .values(is_read=is_read) \
+                .returning(Email.user_email_id, Email.sender_id, Email.is_read)
+        else:
+            return 0
+        changed = list(await self.session.execute(stmt))
+
+        delta = MailboxStatsDelta()
+        for row in changed:
+            if action == EmailAction.trash:
+                delta.remove(row.user_email_id, row.sender_id, row.is_read, row.recieved_at)
+            else:
+                delta.add(row.user_email_id, row.sender_id, 0, -1 if row.is_read else 1)
+        await ApplyMailboxStats(self.session).execute(delta)
+        return len(changed)
@@ -0,0 +1,25 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from errors import ClientError
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(
+        values,
+        default=lambda value: value.isoformat() if isinstance(value, datetime) else value,
+    )
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, binascii.Error) as exc:
+        raise ClientError("Invalid cursor.") from exc
+    if not isinstance(values, list):
+        raise ClientError("Invalid cursor.")
+    return values
@@ -0,0 +1,191 @@
+from datetime import UTC, datetime
+from enum import StrEnum, auto
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+class FetchedEmailOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    external_id: str
+    from_email: str
+    from_name: str | None = None
+    subject: str
+    snippet: str
+    recieved_at: datetime
+    is_read: bool
+
+
+class FetchedEmail(FetchedEmailOut):
+    user_email_id: int
+
+
+class EmailOut(FetchedEmailOut):
+    id: int
+
+
+class EmailPage(BaseModel):
+    items: list[EmailOut]
+    next_cursor: str | None = None
+
+
+class EmailSearchHit(EmailOut):
+    rank: float
+
+
+class EmailSearchPage(BaseModel):
+    items: list[EmailSearchHit]
+    next_cursor: str | None = None
+
+
+class EmailAttachmentOut(BaseModel):
+    filename: str
+    mime_type: str
+    size: int
+    attachment_id: str | None = None
+
+
+class EmailContentOut(BaseModel):
+    text: str | None = None
+    html: str | None = None
+    attachments: list[EmailAttachmentOut] = []
+
+
+class SenderStatsOut(BaseModel):
+    from_email: str
+    from_name: str | None = None
+    total: int
+    unread: int
+
+
+class MailboxStatsOut(BaseModel):
+    email: str
+    total: int = 0
+    unread: int = 0
+    newest_recieved_at: datetime | None = None
+    top_senders: list[SenderStatsOut] = []
+
+
+class SaveEmailsResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+
+
+class SyncResult(SaveEmailsResult):
+    email: str
+    fetched: int = 0
+
+
+class SyncEmailsOut(SyncResult):
+    emails: list[FetchedEmailOut]
+
+
+class MailboxSyncOut(BaseModel):
+    email: str
+    result: SyncResult | None = None
+    error: str | None = None
+
+
+class SyncAllEmailsOut(BaseModel):
+    fetched: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    mailboxes: list[MailboxSyncOut]
+
+
+class SyncJobStatus(StrEnum):
+    queued = auto()
+    running = auto()
+    done = auto()
+    failed = auto()
+
+
+class SyncJobCreated(BaseModel):
+    job_id: str
+
+
+class SyncJobOut(BaseModel):
+    id: str
+    status: SyncJobStatus
+    stage: str | None = None
+    result: SyncResult | None = None
+    error: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+
+
+class EmailAction(StrEnum):
+    mark_read = auto()
+    mark_unread = auto()
+    archive = auto()
+    trash = auto()
+
+
+class EmailActionFilter(BaseModel):
+    sender: str | None = None
+    is_read: bool | None = None
+    recieved_before: datetime | None = None
+    recieved_after: datetime | None = None
+
+    @field_validator("recieved_before", "recieved_after")
+    @classmethod
+    def to_naive_utc(cls, value: datetime | None) -> datetime | None:
+        # recieved_at is stored as naive UTC, naive input is taken as UTC.
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(UTC).replace(tzinfo=None)
+
+
+class EmailActionData(BaseModel):
+    email: str
+    action: EmailAction
+    # Either explicit email ids or a filter over the stored emails.
+    ids: list[int] | None = None
+    filter: EmailActionFilter = EmailActionFilter()
+
+
+class EmailActionResult(BaseModel):
+    email: str
+    action: EmailAction
+    matched: int = 0
+    changed: int = 0
+    # Checkpoint: emails are processed in id order, a resumed job continues
+    # after this id.
+    last_id: int | None = None
+
+
+class EmailActionJobOut(BaseModel):
+    id: str
+    status: SyncJobStatus
+    result: EmailActionResult | None = None
+    error: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+
+
+class PubSubMessage(BaseModel):
+    data: str
+    message_id: str | None = Field(default=None, alias="messageId")
+    publish_time: datetime | None = Field(default=None, alias="publishTime")
+
+
+class PubSubEnvelope(BaseModel):
+    message: PubSubMessage
+    subscription: str | None = None
+
+
+class GmailNotification(BaseModel):
+    email_address: str = Field(alias="emailAddress")
+    history_id: int = Field(alias="historyId")
+
+
+class GmailPushStatus(StrEnum):
+    queued = auto()
+    coalesced = auto()
+    ignored = auto()
+
+
+class GmailPushOut(BaseModel):
+    status: GmailPushStatus
+    job_id: str | None = None
@@ -0,0 +1,249 @@
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import redis.asyncio as redis
+
+from config import Settings
+from errors import ClientError
+from services.auth.dtos import EmailSyncData, UserOut
+from services.emails.dtos import (
+    EmailActionData,
+    EmailActionJobOut,
+    EmailActionResult,
+    SyncJobOut,
+    SyncJobStatus,
+    SyncResult,
+)
+
+SYNC_QUEUE_KEY = "sync:queue"
+SYNC_JOB_KEY_PREFIX = "sync:job:"
+ACTION_QUEUE_KEY = "actions:queue"
+ACTION_PROCESSING_KEY = "actions:processing"
+ACTION_JOB_KEY_PREFIX = "actions:job:"
+
+
+class SyncJobQueue:
+    def __init__(self, redis: redis.Redis, settings: Settings):
+        self.redis = redis
+        self.job_ttl = settings.sync_job_ttl_seconds
+        self.result_ttl = settings.sync_job_result_ttl_seconds
+
+    async def enqueue(self, data: EmailSyncData, current_user: UserOut) -> str:
+        if data.email not in [e.email for e in current_user.emails]:
+            raise ClientError("Email does not belong to the user.")
+        return await self.enqueue_for_user(data, current_user.id)
+
+    async def enqueue_for_user(
+        self,
+        data: EmailSyncData,
+        user_id: int,
+        pending_key: str | None = None,
+    ) -> str:
+        job_id = uuid4().hex
+        key = SYNC_JOB_KEY_PREFIX + job_id
+        job = {
+            "status": SyncJobStatus.queued,
+            "user_id": user_id,
+            "data": data.model_dump_json(),
+            "created_at": datetime.now().isoformat(),
+        }
+        if pending_key:
+            job["pending_key"] = pending_key
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=job)
+            pipe.expire(key, self.job_ttl)
+            pipe.lpush(SYNC_QUEUE_KEY, job_id)
+            await pipe.execute()
+        return job_id
+
+    async def get(self, job_id: str, user_id: int) -> SyncJobOut:
+        job = await self._get_job(job_id)
+        if not job or int(job["user_id"]) != user_id:
+            raise ClientError("Sync job not found.")
+        return SyncJobOut(
+            id=job_id,
+            status=job["status"],
+            stage=job.get("stage"),
+            result=SyncResult.model_validate_json(job["result"]) if "result" in job else None,
+            error=job.get("error"),
+            created_at=job["created_at"],
+            finished_at=job.get("finished_at"),
+        )
+
+    async def pop(self, timeout: float) -> tuple[str, int, EmailSyncData] | None:
+        while True:
+            item = await self.redis.brpop([SYNC_QUEUE_KEY], timeout=timeout)
+            if item is None:
+                return None
+            job_id = item[1].decode()
+            job = await self._get_job(job_id)
+            # Jobs that sat in the queue longer than their TTL are gone.
+            if job:
+                # Once the sync starts, new notifications must queue another
+                # one, or changes that land mid-sync would wait for the next.
+                if "pending_key" in job:
+                    await self.redis.delete(job["pending_key"])
+                data = EmailSyncData.model_validate_json(job["data"])
+                return job_id, int(job["user_id"]), data
+
+    async def set_stage(self, job_id: str, stage: str) -> None:
+        await self.redis.hset(SYNC_JOB_KEY_PREFIX + job_id, mapping={
+            "status": SyncJobStatus.running,
+            "stage": stage,
+        })
+
+    async def mark_done(self, job_id: str, result: SyncResult) -> None:
+        await self._finish(job_id, {
+            "status": SyncJobStatus.done,
+            "result": result.model_dump_json(),
+        })
+
+    async def mark_failed(self, job_id: str, error: str) -> None:
+        await self._finish(job_id, {
+            "status": SyncJobStatus.failed,
+            "error": error,
+        })
+
+    async def _finish(self, job_id: str, mapping: dict) -> None:
+        key = SYNC_JOB_KEY_PREFIX + job_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                **mapping,
+                "finished_at": datetime.now().isoformat(),
+            })
+            pipe.hdel(key, "stage")
+            pipe.expire(key, self.result_ttl)
+            await pipe.execute()
+
+    async def _get_job(self, job_id: str) -> dict[str, str]:
+        raw = await self.redis.hgetall(SYNC_JOB_KEY_PREFIX + job_id)
+        return {key.decode(): value.decode() for key, value in raw.items()}
+
+
+# Unlike sync jobs, a popped action job stays in a processing list until it
+# finishes. The worker running it renews a lease after every chunk; jobs
+# whose lease ran out (the worker died) are put back on the queue and resume
+# after their last checkpoint.
+class EmailActionJobQueue:
+    def __init__(self, redis: redis.Redis, settings: Settings):
+        self.redis = redis
+        self.job_ttl = settings.sync_job_ttl_seconds
+        self.result_ttl = settings.sync_job_result_ttl_seconds
+        self.lease = settings.email_action_job_lease_seconds
+
+    async def enqueue(self, data: EmailActionData, current_user: UserOut) -> str:
+        if data.email not in [e.email for e in current_user.emails]:
+            raise ClientError("Email does not belong to the user.")
+        job_id = uuid4().hex
+        key = ACTION_JOB_KEY_PREFIX + job_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "status": SyncJobStatus.queued,
+                "user_id": current_user.id,
+                "data": data.model_dump_json(),
+                "created_at": datetime.now().isoformat(),
+            })
+            pipe.expire(key, self.job_ttl)
+            pipe.lpush(ACTION_QUEUE_KEY, job_id)
+            await pipe.execute()
+        return job_id
+
+    async def get(self, job_id: str, user_id: int) -> EmailActionJobOut:
+        job = await self._get_job(job_id)
+        if not job or int(job["user_id"]) != user_id:
+            raise ClientError("Action job not found.")
+        return EmailActionJobOut(
+            id=job_id,
+            status=job["status"],
+            result=EmailActionResult.model_validate_json(job["result"]) if "result" in job else None,
+            error=job.get("error"),
+            created_at=job["created_at"],
+            finished_at=job.get("finished_at"),
+        )
+
+    async def pop(
+        self,
+        timeout: float,
+    ) -> tuple[str, int, EmailActionData, EmailActionResult | None] | None:
+        while True:
+            job_id = await self.redis.blmove(
+                ACTION_QUEUE_KEY, ACTION_PROCESSING_KEY, timeout, "RIGHT", "LEFT"
+            )
+            if job_id is None:
+                return None
+            job_id = job_id.decode()
+            job = await self._get_job(job_id)
+            if not job:
+                await self.redis.lrem(ACTION_PROCESSING_KEY, 0, job_id)
+                continue
+            await self.redis.hset(ACTION_JOB_KEY_PREFIX + job_id, mapping={
+                "status": SyncJobStatus.running,
+                "lease_until": time.time() + self.lease,
+            })
+            data = EmailActionData.model_validate_json(job["data"])
+            progress = EmailActionResult.model_validate_json(job["result"]) if "result" in job else None
+            return job_id, int(job["user_id"]), data, progress
+
+    async def checkpoint(self, job_id: str, progress: EmailActionResult) -> None:
+        key = ACTION_JOB_KEY_PREFIX + job_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "result": progress.model_dump_json(),
+                "lease_until": time.time() + self.lease,
+            })
+            pipe.expire(key, self.job_ttl)
+            await pipe.execute()
+
+    async def requeue_expired(self) -> int:
+        requeued = 0
+        now = time.time()
+        for job_id in await self.redis.lrange(ACTION_PROCESSING_KEY, 0, -1):
+            key = ACTION_JOB_KEY_PREFIX + job_id.decode()
+            job = await self._get_job(job_id.decode())
+            if job and "lease_until" not in job:
+                # Just popped, the worker sets its lease right after BLMOVE.
+                # Start one here in case it died in between, it is requeued
+                # once that runs out.
+                await self.redis.hsetnx(key, "lease_until", now + self.lease)
+                continue
+            if job and float(job["lease_until"]) > now:
+                continue
+            # Only the consumer whose LREM removed the id puts it back, so
+            # concurrent sweeps don't queue a job twice.
+            if await self.redis.lrem(ACTION_PROCESSING_KEY, 1, job_id) and job:
+                # The old lease goes too, or the next pop would look expired.
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.hdel(key, "lease_until")
+                    pipe.rpush(ACTION_QUEUE_KEY, job_id)
+                    await pipe.execute()
+                requeued += 1
+        return requeued
+
+    async def mark_done(self, job_id: str, result: EmailActionResult) -> None:
+        await self._finish(job_id, {
+            "status": SyncJobStatus.done,
+            "result": result.model_dump_json(),
+        })
+
+    async def mark_failed(self, job_id: str, error: str) -> None:
+        await self._finish(job_id, {
+            "status": SyncJobStatus.failed,
+            "error": error,
+        })
+
+    async def _finish(self, job_id: str, mapping: dict) -> None:
+        key = ACTION_JOB_KEY_PREFIX + job_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                **mapping,
+                "finished_at": datetime.now().isoformat(),
+            })
+            pipe.hdel(key, "lease_until")
+            pipe.expire(key, self.result_ttl)
+            pipe.lrem(ACTION_PROCESSING_KEY, 0, job_id)
+            await pipe.execute()
+
+    async def _get_job(self, job_id: str) -> dict[str, str]:
+        raw = await self.redis.hgetall(ACTION_JOB_KEY_PREFIX + job_id)
+        return {key.decode(): value.decode() for key, value in raw.items()}
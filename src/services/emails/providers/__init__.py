@@ -0,0 +1,6 @@
+from db.models import ProviderType
+from registry import LazyRegistry
+
+EMAIL_PROVIDERS = LazyRegistry({
+    ProviderType.google: "services.emails.providers.google:GoogleEmailProvider",
+})
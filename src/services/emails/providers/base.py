@@ -1,7 +1,92 @@
+from datetime import datetime
 from typing import Protocol
 
+import httpx
 
+from services.emails.dtos import EmailAction, EmailContentOut, FetchedEmail
+from services.emails.ratelimit import MailboxRateLimiter
+
+
+# What EmailService calls on a provider class from EMAIL_PROVIDERS.
 class EmailProviderProtocol(Protocol):
     @classmethod
-    async def fetch_emails(cls, user_email_id: int, access_token: str, count: int) -> list[Email]:
+    async def fetch_new_emails(
+        cls,
+        client: httpx.AsyncClient,
+        user_email_id: int,
+        access_token: str,
+        count: int,
+        start_history_id: str | None = None,
+        concurrency: int = 10,
+        use_batch: bool = False,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[list[FetchedEmail], str | None]:
+        ...
+
+    @classmethod
+    async def fetch_history(
+        cls,
+        client: httpx.AsyncClient,
+        user_email_id: int,
+        access_token: str,
+        count: int,
+        start_history_id: str,
+        concurrency: int = 10,
+        use_batch: bool = False,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[list[FetchedEmail], str]:
+        ...
+
+    @classmethod
+    async def fetch_emails(
+        cls,
+        client: httpx.AsyncClient,
+        user_email_id: int,
+        access_token: str,
+        count: int,
+        concurrency: int = 10,
+        use_batch: bool = False,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> list[FetchedEmail]:
+        ...
+
+    @classmethod
+    async def fetch_message_content(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        message_id: str,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> EmailContentOut:
+        ...
+
+    @classmethod
+    async def modify_messages(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        message_ids: list[str],
+        action: EmailAction,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> None:
+        ...
+
+    @classmethod
+    async def get_history_id(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> str:
+        ...
+
+    @classmethod
+    async def watch(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        topic_name: str,
+        label_ids: list[str],
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[str, datetime]:
         ...
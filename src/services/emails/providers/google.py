@@ -1,69 +1,587 @@
-from email.utils import parsedate_to_datetime
+import asyncio
+import base64
+import json
+import secrets
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from email.message import Message
+from email.utils import parseaddr, parsedate_to_datetime
+from functools import partial
+from urllib.parse import urlencode
 
 import httpx
 
-from db.models import Email
-from errors import EmailAuthError
+from errors import EmailAuthError, EmailHistoryExpiredError
+from metrics import GMAIL_MESSAGE_BYTES, SYNC_STAGE_SECONDS
+from services.emails.dtos import (
+    EmailAction,
+    EmailAttachmentOut,
+    EmailContentOut,
+    FetchedEmail,
+)
+from services.emails.ratelimit import MailboxRateLimiter, is_throttled_item
 
 GMAIL_API_BASE = "https://gmail.googleapis.com/gmail/v1"
+GMAIL_BATCH_URL = "https://gmail.googleapis.com/batch/gmail/v1"
+GMAIL_BATCH_MAX_SIZE = 100
+GMAIL_HISTORY_PAGE_SIZE = 500
+GMAIL_HISTORY_TYPES = ["messageAdded", "labelAdded", "labelRemoved", "messageDeleted"]
+GMAIL_MODIFY_MAX_IDS = 1000
+# Google only gzips responses for clients whose User-Agent says "gzip".
+GMAIL_USER_AGENT = "email-oauth-fastapi-template (gzip)"
+# Partial responses: only the headers and fields _to_email reads.
+GMAIL_METADATA_PARAMS = {
+    "format": "metadata",
+    "metadataHeaders": ["From", "Subject", "Date"],
+    "fields": "id,labelIds,snippet,internalDate,payload/headers",
+}
+GMAIL_HEADER_NAMES = ("from", "subject", "date")
+GMAIL_LIST_FIELDS = "messages/id,nextPageToken"
+GMAIL_HISTORY_FIELDS = (
+    "history(id,messagesAdded/message/id,labelsAdded(message/id,labelIds),"
+    "labelsRemoved/message/id,messagesDeleted/message/id),historyId,nextPageToken"
+)
+# messages.list leaves these out by default, history and GET do not.
+GMAIL_HIDDEN_LABELS = frozenset({"TRASH", "SPAM"})
+# Label changes behind each bulk action: (add, remove).
+GMAIL_ACTION_LABELS = {
+    EmailAction.mark_read: ([], ["UNREAD"]),
+    EmailAction.mark_unread: (["UNREAD"], []),
+    EmailAction.archive: ([], ["INBOX"]),
+    EmailAction.trash: (["TRASH"], ["INBOX"]),
+}
 
 
 class GoogleEmailProvider:
 
     @classmethod
-    async def fetch_emails(
+    async def fetch_new_emails(
         cls,
+        client: httpx.AsyncClient,
         user_email_id: int,
         access_token: str,
         count: int,
-    ) -> list[Email]:
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
+        start_history_id: str | None = None,
+        concurrency: int = 10,
+        use_batch: bool = False,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[list[FetchedEmail], str | None]:
+        if start_history_id:
+            try:
+                return await cls.fetch_history(
+                    client,
+                    user_email_id,
+                    access_token,
+                    count,
+                    start_history_id,
+                    concurrency=concurrency,
+                    use_batch=use_batch,
+                    limiter=limiter,
+                )
+            except EmailHistoryExpiredError:
+                pass
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{GMAIL_API_BASE}/users/me/messages",
-                headers=headers,
-                params={"maxResults": count}
-            )
+        # Take the mailbox history id before listing, so changes that land
+        # while we list are replayed by the next incremental sync.
+        history_id = await cls.get_history_id(client, access_token, limiter=limiter)
+        emails = await cls.fetch_emails(
+            client,
+            user_email_id,
+            access_token,
+            count,
+            concurrency=concurrency,
+            use_batch=use_batch,
+            limiter=limiter,
+        )
+        return emails, history_id
+
+    @classmethod
+    async def get_history_id(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> str:
+        headers = cls._headers(access_token)
+
+        resp = await cls._send(limiter, "getProfile", partial(
+            client.get,
+            f"{GMAIL_API_BASE}/users/me/profile",
+            headers=headers,
+        ))
+        if resp.status_code == 401:
+            raise EmailAuthError("Email access token is unauthorized.")
+        resp.raise_for_status()
+        return str(resp.json()["historyId"])
+
+    @classmethod
+    async def watch(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        topic_name: str,
+        label_ids: list[str],
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[str, datetime]:
+        headers = cls._headers(access_token)
+
+        resp = await cls._send(limiter, "watch", partial(
+            client.post,
+            f"{GMAIL_API_BASE}/users/me/watch",
+            headers=headers,
+            json={
+                "topicName": topic_name,
+                "labelIds": label_ids,
+                "labelFilterBehavior": "include",
+            },
+        ))
+        if resp.status_code == 401:
+            raise EmailAuthError("Email access token is unauthorized.")
+        resp.raise_for_status()
+
+        resp_data = resp.json()
+        expires_at = datetime.fromtimestamp(int(resp_data["expiration"]) / 1000)
+        return str(resp_data["historyId"]), expires_at
+
+    @classmethod
+    async def modify_messages(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        message_ids: list[str],
+        action: EmailAction,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> None:
+        headers = cls._headers(access_token)
+        add_label_ids, remove_label_ids = GMAIL_ACTION_LABELS[action]
+
+        # One call for up to GMAIL_MODIFY_MAX_IDS messages, 50 quota units.
+        resp = await cls._send(limiter, "messages.batchModify", partial(
+            client.post,
+            f"{GMAIL_API_BASE}/users/me/messages/batchModify",
+            headers=headers,
+            json={
+                "ids": message_ids,
+                "addLabelIds": add_label_ids,
+                "removeLabelIds": remove_label_ids,
+            },
+        ))
+        if resp.status_code == 401:
+            raise EmailAuthError("Email access token is unauthorized.")
+        resp.raise_for_status()
+
+    @classmethod
+    async def fetch_history(
+        cls,
+        client: httpx.AsyncClient,
+        user_email_id: int,
+        access_token: str,
+        count: int,
+        start_history_id: str,
+        concurrency: int = 10,
+        use_batch: bool = False,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[list[FetchedEmail], str]:
+        headers = cls._headers(access_token)
+
+        message_ids: dict[str, None] = {}
+        history_id = None
+        page_token = None
+        while history_id is None:
+            params = {
+                "startHistoryId": start_history_id,
+                "historyTypes": GMAIL_HISTORY_TYPES,
+                "maxResults": GMAIL_HISTORY_PAGE_SIZE,
+                "fields": GMAIL_HISTORY_FIELDS,
+            }
+            if page_token:
+                params["pageToken"] = page_token
+            with SYNC_STAGE_SECONDS.time("gmail_list"):
+                resp = await cls._send(limiter, "history.list", partial(
+                    client.get,
+                    f"{GMAIL_API_BASE}/users/me/history",
+                    headers=headers,
+                    params=params,
+                ))
             if resp.status_code == 401:
                 raise EmailAuthError("Email access token is unauthorized.")
+            if resp.status_code == 404:
+                raise EmailHistoryExpiredError("Email history id has expired.")
             resp.raise_for_status()
 
-            messages = resp.json().get("messages", [])
-            if not messages:
-                return []
+            resp_data = resp.json()
+            for record in resp_data.get("history", []):
+                for key in ("messagesAdded", "labelsAdded", "labelsRemoved"):
+                    for item in record.get(key, []):
+                        # Re-insert to move the id to the newest position.
+                        message_ids.pop(item["message"]["id"], None)
+                        message_ids[item["message"]["id"]] = None
+                # Moving to trash or spam counts as a delete, including our
+                # own trash action.
+                for item in record.get("labelsAdded", []):
+                    if GMAIL_HIDDEN_LABELS.intersection(item.get("labelIds", ())):
+                        message_ids.pop(item["message"]["id"], None)
+                for item in record.get("messagesDeleted", []):
+                    message_ids.pop(item["message"]["id"], None)
+                # History goes from oldest to newest. Once `count` messages
+                # changed, stop at this record and hand back its id, so the
+                # next sync resumes right after it instead of skipping the
+                # remaining changes.
+                if len(message_ids) >= count:
+                    history_id = str(record["id"])
+                    break
+            else:
+                page_token = resp_data.get("nextPageToken")
+                if not page_token:
+                    history_id = str(resp_data.get("historyId", start_history_id))
 
-            emails = []
-            for msg in messages:
-                msg_resp = await client.get(
-                    f"{GMAIL_API_BASE}/users/me/messages/{msg['id']}",
-                    headers=headers,
-                    params={"format": "metadata"}
+        # Newest first, like messages.list.
+        changed_ids = list(message_ids)[::-1]
+        if not changed_ids:
+            return [], history_id
+
+        emails = await cls._fetch_messages(
+            client, headers, user_email_id, changed_ids, concurrency, use_batch, limiter
+        )
+        return emails, history_id
+
+    @classmethod
+    async def fetch_emails(
+        cls,
+        client: httpx.AsyncClient,
+        user_email_id: int,
+        access_token: str,
+        count: int,
+        concurrency: int = 10,
+        use_batch: bool = False,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> list[FetchedEmail]:
+        headers = cls._headers(access_token)
+
+        with SYNC_STAGE_SECONDS.time("gmail_list"):
+            resp = await cls._send(limiter, "messages.list", partial(
+                client.get,
+                f"{GMAIL_API_BASE}/users/me/messages",
+                headers=headers,
+                params={"maxResults": count, "fields": GMAIL_LIST_FIELDS},
+            ))
+        if resp.status_code == 401:
+            raise EmailAuthError("Email access token is unauthorized.")
+        resp.raise_for_status()
+
+        messages = resp.json().get("messages", [])
+        if not messages:
+            return []
+
+        message_ids = [msg["id"] for msg in messages]
+        return await cls._fetch_messages(
+            client, headers, user_email_id, message_ids, concurrency, use_batch, limiter
+        )
+
+    @classmethod
+    async def fetch_message_content(
+        cls,
+        client: httpx.AsyncClient,
+        access_token: str,
+        message_id: str,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> EmailContentOut:
+        headers = cls._headers(access_token)
+
+        resp = await cls._send(limiter, "messages.get", partial(
+            client.get,
+            f"{GMAIL_API_BASE}/users/me/messages/{message_id}",
+            headers=headers,
+            params={"format": "full"},
+        ))
+        if resp.status_code == 401:
+            raise EmailAuthError("Email access token is unauthorized.")
+        resp.raise_for_status()
+        return cls._to_content(resp.json()["payload"])
+
+    @classmethod
+    async def _fetch_messages(
+        cls,
+        client: httpx.AsyncClient,
+        headers: dict,
+        user_email_id: int,
+        message_ids: list[str],
+        concurrency: int,
+        use_batch: bool,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> list[FetchedEmail]:
+        with SYNC_STAGE_SECONDS.time("metadata_fetch"):
+            if use_batch:
+                emails_data = await cls._fetch_metadata_batch(
+                    client, headers, message_ids, limiter
                 )
-                if msg_resp.status_code == 401:
-                    raise EmailAuthError("Email access token is unauthorized.")
-                msg_resp.raise_for_status()
-                email_data = msg_resp.json()
-                for data in email_data["payload"]["headers"]:
-                    if data["name"] == "From":
-                        from_email = data["value"]
-                    elif data["name"] == "Subject":
-                        subject = data["value"]
-                    elif data["name"] == "Date":
-                        recieved_at = data["value"]
-                dt_recieved_at = parsedate_to_datetime(recieved_at).replace(tzinfo=None)
-                emails.append(
-                    Email(
-                        user_email_id=user_email_id,
-                        external_id=msg["id"],
-                        from_email=from_email,
-                        subject=subject,
-                        snippet=email_data["snippet"],
-                        recieved_at=dt_recieved_at,
-                        is_read="UNREAD" not in email_data["labelIds"],
+            else:
+                emails_data = await cls._fetch_metadata_concurrent(
+                    client, headers, message_ids, concurrency, limiter
+                )
+
+        # Messages deleted since they were listed come back as None, ones
+        # in trash or spam are skipped like messages.list does.
+        with SYNC_STAGE_SECONDS.time("parse"):
+            return [
+                cls._to_email(user_email_id, message_id, email_data)
+                for message_id, email_data in zip(message_ids, emails_data)
+                if email_data is not None
+                and not GMAIL_HIDDEN_LABELS.intersection(email_data.get("labelIds", ()))
+            ]
+
+    @classmethod
+    async def _fetch_metadata_concurrent(
+        cls,
+        client: httpx.AsyncClient,
+        headers: dict,
+        message_ids: list[str],
+        concurrency: int,
+        limiter: MailboxRateLimiter | None = None,
+    ) -> list[dict | None]:
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def fetch_one(message_id: str) -> dict | None:
+            async with semaphore:
+                msg_resp = await cls._send(limiter, "messages.get", partial(
+                    client.get,
+                    f"{GMAIL_API_BASE}/users/me/messages/{message_id}",
+                    headers=headers,
+                    params=GMAIL_METADATA_PARAMS,
+                ))
+            if msg_resp.status_code == 401:
+                raise EmailAuthError("Email access token is unauthorized.")
+            if msg_resp.status_code == 404:
+                return None
+            msg_resp.raise_for_status()
+            GMAIL_MESSAGE_BYTES.observe(msg_resp.num_bytes_downloaded, "get")
+            return msg_resp.json()
+
+        # gather keeps the order of message_ids and re-raises the first error
+        # as is, so a 401 still surfaces as a plain EmailAuthError.
+        tasks = [asyncio.create_task(fetch_one(message_id)) for message_id in message_ids]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    @classmethod
+    async def _fetch_metadata_batch(
+        cls,
+        client: httpx.AsyncClient,
+        headers: dict,
+        message_ids: list[str],
+        limiter: MailboxRateLimiter | None = None,
+    ) -> list[dict | None]:
+        emails_data = []
+        for start in range(0, len(message_ids), GMAIL_BATCH_MAX_SIZE):
+            chunk = message_ids[start:start + GMAIL_BATCH_MAX_SIZE]
+            results: dict[str, dict | None] = {}
+            pending = chunk
+            attempt = 0
+            while pending:
+                fetched, throttled = await cls._send_batch(client, headers, pending, limiter)
+                results.update(fetched)
+                if not throttled:
+                    break
+                # Gmail throttles batch items one by one. Only those are sent
+                # again, once the limiter has backed the mailbox off.
+                if limiter is None or not limiter.on_throttle("messages.get", 429, attempt):
+                    request = httpx.Request("POST", GMAIL_BATCH_URL)
+                    raise httpx.HTTPStatusError(
+                        f"{len(throttled)} batch items were rate limited.",
+                        request=request,
+                        response=httpx.Response(429, request=request),
                     )
+                pending = throttled
+                attempt += 1
+            emails_data.extend(results[message_id] for message_id in chunk)
+        return emails_data
+
+    @classmethod
+    async def _send_batch(
+        cls,
+        client: httpx.AsyncClient,
+        headers: dict,
+        message_ids: list[str],
+        limiter: MailboxRateLimiter | None = None,
+    ) -> tuple[dict[str, dict | None], list[str]]:
+        # Returns the fetched messages by id and the ids that were throttled.
+        boundary = f"batch_{secrets.token_hex(8)}"
+        query = urlencode(GMAIL_METADATA_PARAMS, doseq=True)
+        parts = []
+        for index, message_id in enumerate(message_ids):
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <item{index}>\r\n"
+                "\r\n"
+                f"GET /gmail/v1/users/me/messages/{message_id}?{query}\r\n"
+                "\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+
+        # Each item of a batch is billed as a separate call.
+        resp = await cls._send(limiter, "messages.get", partial(
+            client.post,
+            GMAIL_BATCH_URL,
+            headers={
+                **headers,
+                "Content-Type": f"multipart/mixed; boundary={boundary}",
+            },
+            content="".join(parts).encode(),
+        ), count=len(message_ids))
+        if resp.status_code == 401:
+            raise EmailAuthError("Email access token is unauthorized.")
+        resp.raise_for_status()
+        GMAIL_MESSAGE_BYTES.observe(resp.num_bytes_downloaded / len(message_ids), "batch")
+
+        results: dict[str, dict | None] = {}
+        throttled = []
+        for content_id, status_code, body in cls._parse_batch_response(resp):
+            message_id = message_ids[int(content_id.removeprefix("response-item"))]
+            if status_code == 401:
+                raise EmailAuthError("Email access token is unauthorized.")
+            if status_code == 404:
+                results[message_id] = None
+                continue
+            if is_throttled_item(status_code, body):
+                throttled.append(message_id)
+                continue
+            if status_code >= 400:
+                raise httpx.HTTPStatusError(
+                    f"Batch item {content_id} failed with status {status_code}.",
+                    request=resp.request,
+                    response=resp,
                 )
+            results[message_id] = body
+
+        if len(results) + len(throttled) != len(message_ids):
+            raise ValueError("Gmail batch response is missing items.")
+        return results, throttled
+
+    @staticmethod
+    def _headers(access_token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {access_token}",
+            "User-Agent": GMAIL_USER_AGENT,
+        }
+
+    @staticmethod
+    async def _send(
+        limiter: MailboxRateLimiter | None,
+        call: str,
+        request: Callable[[], Awaitable[httpx.Response]],
+        count: int = 1,
+    ) -> httpx.Response:
+        if limiter is None:
+            return await request()
+        return await limiter.send(call, request, count)
+
+    @staticmethod
+    def _parse_batch_response(
+        resp: httpx.Response,
+    ) -> list[tuple[str, int, dict]]:
+        content_type = resp.headers.get("Content-Type", "")
+        boundary = content_type.split("boundary=", 1)[-1].strip('"')
+        items = []
+        for part in resp.text.split(f"--{boundary}"):
+            part = part.strip()
+            if not part or part == "--":
+                continue
+            # Each part is: MIME headers, blank line, raw HTTP response.
+            mime_headers, _, http_response = part.partition("\r\n\r\n")
+            content_id = ""
+            for line in mime_headers.splitlines():
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-id":
+                    content_id = value.strip().strip("<>")
+            status_line, _, rest = http_response.partition("\r\n")
+            status_code = int(status_line.split(" ")[1])
+            _, _, body = rest.partition("\r\n\r\n")
+            items.append((content_id, status_code, json.loads(body) if body.strip() else {}))
+        return items
+
+    @classmethod
+    def _to_content(cls, payload: dict) -> EmailContentOut:
+        content = EmailContentOut()
+        # Depth first in document order, the first text/plain and text/html
+        # parts are the body, parts with a filename are attachments.
+        parts = [payload]
+        while parts:
+            part = parts.pop()
+            parts.extend(reversed(part.get("parts", [])))
+            mime_type = part.get("mimeType", "")
+            body = part.get("body", {})
+            if part.get("filename"):
+                content.attachments.append(EmailAttachmentOut(
+                    filename=part["filename"],
+                    mime_type=mime_type,
+                    size=body.get("size", 0),
+                    attachment_id=body.get("attachmentId"),
+                ))
+            elif mime_type == "text/plain" and content.text is None and "data" in body:
+                content.text = cls._decode_part(part)
+            elif mime_type == "text/html" and content.html is None and "data" in body:
+                content.html = cls._decode_part(part)
+        return content
+
+    @staticmethod
+    def _decode_part(part: dict) -> str:
+        data = part["body"]["data"]
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        message = Message()
+        for header in part.get("headers", []):
+            if header["name"].lower() == "content-type":
+                message["Content-Type"] = header["value"]
+        charset = message.get_content_charset() or "utf-8"
+        try:
+            return raw.decode(charset, errors="replace")
+        except LookupError:
+            return raw.decode("utf-8", errors="replace")
+
+    @classmethod
+    def _to_email(cls, user_email_id: int, message_id: str, email_data: dict) -> FetchedEmail:
+        # One pass over the (already projected) headers. Names are matched
+        # case-insensitively, the first occurrence wins and any of them may
+        # be missing.
+        values = {}
+        for header in email_data.get("payload", {}).get("headers", ()):
+            name = header.get("name", "").lower()
+            if name in GMAIL_HEADER_NAMES and name not in values:
+                values[name] = header.get("value", "")
+
+        from_email = values.get("from", "")
+        from_name, from_address = parseaddr(from_email)
+        return FetchedEmail(
+            user_email_id=user_email_id,
+            external_id=message_id,
+            from_email=(from_address or from_email).lower(),
+            from_name=from_name or None,
+            subject=values.get("subject", ""),
+            snippet=email_data.get("snippet", ""),
+            recieved_at=cls._to_recieved_at(
+                values.get("date"), email_data.get("internalDate")
+            ),
+            is_read="UNREAD" not in email_data.get("labelIds", ()),
+        )
 
-            return emails
+    @staticmethod
+    def _to_recieved_at(date: str | None, internal_date: str | None) -> datetime:
+        # Stored as naive UTC whatever the source.
+        if date:
+            try:
+                received_at = parsedate_to_datetime(date)
+            except (TypeError, ValueError):
+                pass
+            else:
+                # "-0000" parses as naive, RFC 5322 still means UTC by it.
+                if received_at.tzinfo is None:
+                    return received_at
+                return received_at.astimezone(UTC).replace(tzinfo=None)
+        # internalDate is when Gmail received the message, in epoch ms.
+        if internal_date:
+            return datetime.fromtimestamp(int(internal_date) / 1000, UTC).replace(tzinfo=None)
+        return datetime.now(UTC).replace(tzinfo=None)
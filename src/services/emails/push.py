@@ -0,0 +1,135 @@
+import base64
+import binascii
+import secrets
+import time
+from functools import cache
+
+import httpx
+import redis.asyncio as redis
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from config import Settings
+from db.models import ProviderType, UserEmail
+from errors import ClientError
+from services.auth.dtos import EmailSyncData
+from services.emails.dtos import (
+    GmailNotification,
+    GmailPushOut,
+    GmailPushStatus,
+    PubSubEnvelope,
+)
+from services.emails.jobs import SyncJobQueue
+
+SYNC_PENDING_KEY_PREFIX = "sync:pending:"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+PUSH_TOKEN_CACHE_TTL_SECONDS = 300
+PUSH_TOKEN_CACHE_MAX_SIZE = 1000
+
+
+@cache
+def get_push_token_cache() -> TTLCache:
+    return TTLCache(PUSH_TOKEN_CACHE_MAX_SIZE, PUSH_TOKEN_CACHE_TTL_SECONDS)
+
+
+class GmailPushService:
+    def __init__(
+        self,
+        session: AsyncSession,
+        redis: redis.Redis,
+        queue: SyncJobQueue,
+        settings: Settings,
+        http_client: httpx.AsyncClient,
+    ):
+        self.session = session
+        self.redis = redis
+        self.queue = queue
+        self.settings = settings
+        self.http_client = http_client
+
+    async def authenticate(self, token: str | None, authorization: str | None) -> None:
+        # Fails closed: without GMAIL_PUSH_TOKEN nothing is accepted.
+        if not self.settings.gmail_push_token:
+            raise ClientError("Gmail push is not configured.")
+        # Pub/Sub push subscriptions carry the shared secret in the endpoint URL.
+        if not secrets.compare_digest(token or "", self.settings.gmail_push_token):
+            raise ClientError("Invalid push token.")
+        if self.settings.gmail_push_audience:
+            await self._verify_oidc_token(authorization)
+
+    async def handle(self, envelope: PubSubEnvelope) -> GmailPushOut:
+        notification = self._decode(envelope)
+
+        stmt = select(UserEmail).where(
+            UserEmail.provider == ProviderType.google,
+            UserEmail.email == notification.email_address.lower(),
+        )
+        result = await self.session.execute(stmt)
+        user_email = result.scalar_one_or_none()
+        # Unknown mailboxes and notifications we have already synced past
+        # are acked, otherwise Pub/Sub keeps redelivering them.
+        if not user_email:
+            return GmailPushOut(status=GmailPushStatus.ignored)
+        if user_email.history_id and int(user_email.history_id) >= notification.history_id:
+            return GmailPushOut(status=GmailPushStatus.ignored)
+
+        # Gmail sends one notification per change, a burst of mail is
+        # collapsed into the single incremental sync still in the queue.
+        pending_key = f"{SYNC_PENDING_KEY_PREFIX}{user_email.id}"
+        if not await self.redis.set(
+            pending_key,
+            1,
+            nx=True,
+            ex=self.settings.sync_push_coalesce_seconds,
+        ):
+            return GmailPushOut(status=GmailPushStatus.coalesced)
+
+        job_id = await self.queue.enqueue_for_user(
+            EmailSyncData(
+                email=user_email.email,
+                count=self.settings.sync_push_count,
+                incremental=True,
+            ),
+            user_email.user_id,
+            pending_key=pending_key,
+        )
+        return GmailPushOut(status=GmailPushStatus.queued, job_id=job_id)
+
+    async def _verify_oidc_token(self, authorization: str | None) -> None:
+        scheme, _, id_token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not id_token:
+            raise ClientError("Missing push authorization.")
+
+        # Pub/Sub reuses a token for about an hour, so Google's tokeninfo
+        # endpoint (which checks the signature and expiry) is asked once.
+        token_cache = get_push_token_cache()
+        claims = token_cache.get(id_token)
+        if claims is None:
+            resp = await self.http_client.get(
+                self.settings.google_tokeninfo_url, params={"id_token": id_token}
+            )
+            if resp.status_code != 200:
+                raise ClientError("Invalid push authorization.")
+            claims = resp.json()
+            token_cache.set(id_token, claims)
+
+        service_account = self.settings.gmail_push_service_account
+        if (
+            claims.get("aud") != self.settings.gmail_push_audience
+            or claims.get("iss") not in GOOGLE_ISSUERS
+            or int(claims.get("exp", 0)) <= time.time()
+            or (service_account and (
+                claims.get("email") != service_account
+                or claims.get("email_verified") != "true"
+            ))
+        ):
+            raise ClientError("Invalid push authorization.")
+
+    def _decode(self, envelope: PubSubEnvelope) -> GmailNotification:
+        try:
+            payload = base64.b64decode(envelope.message.data, validate=True)
+            return GmailNotification.model_validate_json(payload)
+        except (binascii.Error, ValidationError) as exc:
+            raise ClientError("Invalid push message.") from exc
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import asynccontextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import cache
+
+import httpx
+
+from cache import TTLCache
+from metrics import GMAIL_LIMITER_WAIT_SECONDS, GMAIL_THROTTLED
+
+# Gmail quota units per call, see
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_QUOTA_UNITS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.batchModify": 50,
+    "history.list": 2,
+    "getProfile": 1,
+    "watch": 100,
+}
+THROTTLE_STATUSES = (429, 503)
+THROTTLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+MAILBOX_STATE_TTL_SECONDS = 600
+MAILBOX_STATE_MAX_SIZE = 10000
+
+
+# Reserves units up front and lets the balance go negative, so waiters are
+# served in arrival order and nobody polls.
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return max(-self.tokens / self.rate, 0.0)
+
+
+# Concurrency limit that grows by one per window of successes and halves on
+# every throttled response.
+class AIMDLimiter:
+    def __init__(self, initial: int, max_limit: int, min_limit: int = 1):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(initial, max_limit))
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+    def on_throttle(self) -> None:
+        self.limit = max(self.limit / 2, self.min_limit)
+
+
+class MailboxState:
+    def __init__(self, bucket: TokenBucket, concurrency: AIMDLimiter):
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.paused_until = 0.0
+
+
+class GmailRateLimiter:
+    def __init__(
+        self,
+        mailbox_units_per_second: float,
+        process_units_per_second: float,
+        max_concurrency: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+    ):
+        self.mailbox_units_per_second = mailbox_units_per_second
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.process_bucket = TokenBucket(process_units_per_second, process_units_per_second)
+        self._mailboxes = TTLCache(MAILBOX_STATE_MAX_SIZE, MAILBOX_STATE_TTL_SECONDS)
+
+    def for_mailbox(self, mailbox_id: int) -> "MailboxRateLimiter":
+        state = self._mailboxes.get(mailbox_id)
+        if state is None:
+            state = MailboxState(
+                TokenBucket(self.mailbox_units_per_second, self.mailbox_units_per_second),
+                AIMDLimiter(self.max_concurrency, self.max_concurrency),
+            )
+        # Re-set on every use so an active mailbox never loses its state.
+        self._mailboxes.set(mailbox_id, state)
+        return MailboxRateLimiter(self, state)
+
+    def backoff(self, attempt: int, retry_after: float | None) -> float:
+        # Full jitter, never earlier than the server asked for.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.backoff_base))
+        return delay
+
+
+class MailboxRateLimiter:
+    def __init__(self, limiter: GmailRateLimiter, state: MailboxState):
+        self.limiter = limiter
+        self.state = state
+
+    async def send(
+        self,
+        call: str,
+        request: Callable[[], Awaitable[httpx.Response]],
+        count: int = 1,
+    ) -> httpx.Response:
+        units = GMAIL_QUOTA_UNITS[call] * count
+        attempt = 0
+        while True:
+            await self._wait(units)
+            async with self.state.concurrency.slot():
+                resp = await request()
+
+            if not is_throttled(resp):
+                self.state.concurrency.on_success()
+                return resp
+
+            if not self.on_throttle(call, resp.status_code, attempt, parse_retry_after(resp)):
+                return resp
+            attempt += 1
+
+    def on_throttle(
+        self,
+        call: str,
+        status_code: int,
+        attempt: int,
+        retry_after: float | None = None,
+    ) -> bool:
+        # Returns False once the retries are used up.
+        GMAIL_THROTTLED.inc(call, str(status_code))
+        self.state.concurrency.on_throttle()
+        if attempt >= self.limiter.max_retries:
+            return False
+        # Pause the whole mailbox, not just this call, so the other
+        # in-flight fetches back off too.
+        delay = self.limiter.backoff(attempt, retry_after)
+        self.state.paused_until = max(self.state.paused_until, time.monotonic() + delay)
+        return True
+
+    async def _wait(self, units: float) -> None:
+        started = time.monotonic()
+        delay = max(
+            self.state.paused_until - started,
+            self.state.bucket.reserve(units),
+            self.limiter.process_bucket.reserve(units),
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+        GMAIL_LIMITER_WAIT_SECONDS.observe(time.monotonic() - started)
+
+
+def is_throttled(resp: httpx.Response) -> bool:
+    if resp.status_code in THROTTLE_STATUSES:
+        return True
+    # Gmail reports per-user rate limits as 403 with a rateLimitExceeded reason.
+    return resp.status_code == 403 and any(reason in resp.text for reason in THROTTLE_REASONS)
+
+
+def is_throttled_item(status_code: int, body: dict) -> bool:
+    # Same check for one part of a batch response, whose body is already parsed.
+    if status_code in THROTTLE_STATUSES:
+        return True
+    error = body.get("error")
+    errors = error.get("errors", []) if isinstance(error, dict) else []
+    return status_code == 403 and any(item.get("reason") in THROTTLE_REASONS for item in errors)
+
+
+def parse_retry_after(resp: httpx.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+
+
+@cache
+def get_gmail_rate_limiter(
+    mailbox_units_per_second: float,
+    process_units_per_second: float,
+    max_concurrency: int,
+    max_retries: int,
+    backoff_base: float,
+    backoff_max: float,
+) -> GmailRateLimiter:
+    return GmailRateLimiter(
+        mailbox_units_per_second=mailbox_units_per_second,
+        process_units_per_second=process_units_per_second,
+        max_concurrency=max_concurrency,
+        max_retries=max_retries,
+        backoff_base=backoff_base,
+        backoff_max=backoff_max,
+    )
@@ -0,0 +1,62 @@
+from functools import cache
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from cache import TTLCache
+from config import Settings
+from db.models import Sender
+from db.utils import sessionmaker
+
+
+@cache
+def get_local_sender_cache(max_size: int, ttl: float) -> TTLCache:
+    return TTLCache(max_size=max_size, ttl=ttl)
+
+
+# Maps sender addresses to senders.id, creating missing senders in bulk.
+# Senders are never deleted, so cached ids stay valid.
+class SenderResolver:
+    def __init__(self, settings: Settings):
+        self.local = get_local_sender_cache(
+            settings.sender_cache_max_size,
+            settings.sender_cache_ttl_seconds,
+        )
+
+    async def resolve(self, senders: dict[str, str | None]) -> dict[str, int]:
+        ids = {}
+        missing = {}
+        for address, display_name in senders.items():
+            sender_id = self.local.get(address)
+            if sender_id is None:
+                missing[address] = display_name
+            else:
+                ids[address] = sender_id
+        if missing:
+            created = await self._get_or_create(missing)
+            for address, sender_id in created.items():
+                self.local.set(address, sender_id)
+            ids.update(created)
+        return ids
+
+    async def _get_or_create(self, senders: dict[str, str | None]) -> dict[str, int]:
+        # Committed on its own, so the cached ids exist even if the sync
+        # that asked for them rolls back. Sorted inserts keep concurrent
+        # syncs from deadlocking on the unique index.
+        addresses = sorted(senders)
+        async with sessionmaker() as session:
+            stmt = insert(Sender).values([
+                {"address": address, "display_name": (senders[address] or "")[:255] or None}
+                for address in addresses
+            ]).on_conflict_do_nothing(index_elements=["address"]) \
+                .returning(Sender.address, Sender.id)
+            result = await session.execute(stmt)
+            ids = dict(result.tuples())
+
+            existing = [address for address in addresses if address not in ids]
+            if existing:
+                stmt = select(Sender.address, Sender.id).where(Sender.address.in_(existing))
+                result = await session.execute(stmt)
+                ids.update(result.tuples())
+            await session.commit()
+        return ids
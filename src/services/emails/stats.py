@@ -0,0 +1,166 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Email, MailboxSenderStats, MailboxStats
+
+
+# Changes to the stats of one or more mailboxes, summed up per mailbox and
+# per (mailbox, sender) before they are written.
+class MailboxStatsDelta:
+    def __init__(self):
+        self.mailboxes: dict[int, list] = {}
+        self.senders: dict[tuple[int, int], list[int]] = {}
+        # Newest recieved_at among deleted rows, per mailbox.
+        self.removed_newest: dict[int, datetime] = {}
+
+    def add(
+        self,
+        user_email_id: int,
+        sender_id: int,
+        total: int,
+        unread: int,
+        recieved_at: datetime | None = None,
+    ) -> None:
+        mailbox = self.mailboxes.setdefault(user_email_id, [0, 0, None])
+        mailbox[0] += total
+        mailbox[1] += unread
+        if recieved_at and (mailbox[2] is None or recieved_at > mailbox[2]):
+            mailbox[2] = recieved_at
+        sender = self.senders.setdefault((user_email_id, sender_id), [0, 0])
+        sender[0] += total
+        sender[1] += unread
+
+    def remove(
+        self,
+        user_email_id: int,
+        sender_id: int,
+        is_read: bool,
+        recieved_at: datetime,
+    ) -> None:
+        self.add(user_email_id, sender_id, -1, 0 if is_read else -1)
+        newest = self.removed_newest.get(user_email_id)
+        if newest is None or recieved_at > newest:
+            self.removed_newest[user_email_id] = recieved_at
+
+
+class ApplyMailboxStats:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def execute(self, delta: MailboxStatsDelta) -> None:
+        # Runs inside the caller's transaction. mailbox_stats is always
+        # locked first and rows go in key order, so concurrent writers and
+        # RebuildMailboxStats queue up instead of deadlocking.
+        mailboxes = [
+            {
+                "user_email_id": user_email_id,
+                "total": total,
+                "unread": unread,
+                "newest_recieved_at": newest,
+            }
+            for user_email_id, (total, unread, newest) in sorted(delta.mailboxes.items())
+            if total or unread or newest
+        ]
+        if mailboxes:
+            stmt = insert(MailboxStats).values(mailboxes)
+            await self.session.execute(stmt.on_conflict_do_update(
+                index_elements=["user_email_id"],
+                set_={
+                    "total": MailboxStats.total + stmt.excluded.total,
+                    "unread": MailboxStats.unread + stmt.excluded.unread,
+                    "newest_recieved_at": func.greatest(
+                        MailboxStats.newest_recieved_at,
+                        stmt.excluded.newest_recieved_at,
+                    ),
+                    "updated_at": func.now(),
+                },
+            ))
+
+        # When the deleted rows reached the stored newest date, it is looked
+        # up again: one backwards step on ix_emails_user_email_id_recieved_at_id.
+        for user_email_id, removed_newest in sorted(delta.removed_newest.items()):
+            newest = select(func.max(Email.recieved_at)) \
+                .where(Email.user_email_id == user_email_id) \
+                .scalar_subquery()
+            await self.session.execute(
+                MailboxStats.__table__.update()
+                .where(
+                    MailboxStats.user_email_id == user_email_id,
+                    MailboxStats.newest_recieved_at <= removed_newest,
+                )
+                .values(newest_recieved_at=newest, updated_at=func.now())
+            )
+
+        senders = [
+            {
+                "user_email_id": user_email_id,
+                "sender_id": sender_id,
+                "total": total,
+                "unread": unread,
+            }
+            for (user_email_id, sender_id), (total, unread) in sorted(delta.senders.items())
+            if total or unread
+        ]
+        if senders:
+            stmt = insert(MailboxSenderStats).values(senders)
+            await self.session.execute(stmt.on_conflict_do_update(
+                constraint="uq_mailbox_sender_stats_user_email_id_sender_id",
+                set_={
+                    "total": MailboxSenderStats.total + stmt.excluded.total,
+                    "unread": MailboxSenderStats.unread + stmt.excluded.unread,
+                },
+            ))
+
+
+class RebuildMailboxStats:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def execute(self, user_email_id: int) -> None:
+        # Holding the mailbox_stats row lock makes concurrent syncs wait.
+        # Their deltas land on top of the recount once they get the lock,
+        # and syncs that already hold it are committed, so counted, by the
+        # time the recount runs.
+        await self.session.execute(
+            insert(MailboxStats).values(user_email_id=user_email_id)
+            .on_conflict_do_nothing(index_elements=["user_email_id"])
+        )
+        await self.session.execute(
+            select(MailboxStats.id).where(MailboxStats.user_email_id == user_email_id)
+            .with_for_update()
+        )
+
+        unread = func.count().filter(Email.is_read.is_(False))
+        totals = select(func.count(), unread, func.max(Email.recieved_at)) \
+            .where(Email.user_email_id == user_email_id)
+        total, unread_total, newest = (await self.session.execute(totals)).one()
+        await self.session.execute(
+            MailboxStats.__table__.update()
+            .where(MailboxStats.user_email_id == user_email_id)
+            .values(
+                total=total,
+                unread=unread_total,
+                newest_recieved_at=newest,
+                updated_at=func.now(),
+            )
+        )
+
+        await self.session.execute(
+            delete(MailboxSenderStats).where(MailboxSenderStats.user_email_id == user_email_id)
+        )
+        per_sender = select(
+            Email.user_email_id,
+            Email.sender_id,
+            func.count(),
+            unread,
+        ).where(Email.user_email_id == user_email_id) \
+            .group_by(Email.user_email_id, Email.sender_id)
+        await self.session.execute(
+            insert(MailboxSenderStats).from_select(
+                ["user_email_id", "sender_id", "total", "unread"],
+                per_sender,
+            )
+        )
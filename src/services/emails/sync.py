@@ -1,65 +1,553 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
 from datetime import datetime, timedelta
 from functools import partial
 
-from sqlalchemy import select
+import httpx
+import redis.asyncio as redis
+from pydantic_core import to_json
+from redis.exceptions import LockError
+from sqlalchemy import Numeric, and_, cast, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from config import Settings
-from db.models import Email, ProviderType, UserEmail
+from db.models import (
+    Email,
+    MailboxSenderStats,
+    MailboxStats,
+    Sender,
+    UserEmail,
+)
+from db.utils import LazyReadSession, sessionmaker
 from errors import ClientError, EmailAuthError
-from services.auth.dtos import EmailSyncData, UserOut
-from services.auth.providers.google import GoogleOAuthProvider
-from services.emails.providers.google import GoogleEmailProvider
+from metrics import SYNC_EMAILS, SYNC_STAGE_SECONDS, SYNC_UNAUTHORIZED_REFRESHES
+from services.auth.cache import UserCache
+from services.auth.dtos import EmailSyncAllData, EmailSyncData, UserOut
+from services.auth.providers import OAUTH_PROVIDERS
+from services.emails.content import EmailContentCache
+from services.emails.crud import ApplyEmailAction, UpsertEmails
+from services.emails.cursors import decode_cursor, encode_cursor
+from services.emails.dtos import (
+    EmailActionData,
+    EmailActionResult,
+    FetchedEmail,
+    MailboxStatsOut,
+    MailboxSyncOut,
+    SaveEmailsResult,
+    SyncAllEmailsOut,
+    SyncEmailsOut,
+    SyncResult,
+)
+from services.emails.providers import EMAIL_PROVIDERS
+from services.emails.ratelimit import get_gmail_rate_limiter
+from services.emails.senders import SenderResolver
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+SEARCH_TEXT_CONFIG = "simple"
+# Mirrors EmailOut, listings select these as plain rows instead of entities.
+EMAIL_OUT_COLUMNS = (
+    Email.id,
+    Email.external_id,
+    Sender.address.label("from_email"),
+    Sender.display_name.label("from_name"),
+    Email.subject,
+    Email.snippet,
+    Email.recieved_at,
+    Email.is_read,
+)
+
+
+def select_emails_out(*columns):
+    return select(*EMAIL_OUT_COLUMNS, *columns).select_from(Email) \
+        .join(Sender, Sender.id == Email.sender_id)
 
 
 class EmailService:
-    def __init__(self, session: AsyncSession, settings: Settings):
+    def __init__(
+        self,
+        session: AsyncSession,
+        settings: Settings,
+        http_client: httpx.AsyncClient,
+        user_cache: UserCache,
+        redis: redis.Redis,
+        read_session: LazyReadSession | None = None,
+    ):
         self.session = session
+        # Listings and search may be served by a replica, opened on first use.
+        self.read_session = read_session
+        self.content_cache = EmailContentCache(redis, settings)
         self.settings = settings
+        self.http_client = http_client
+        self.user_cache = user_cache
+        self.redis = redis
 
-    async def sync_emails(self, data: EmailSyncData, current_user: UserOut):
+    async def sync_emails(
+        self,
+        data: EmailSyncData,
+        current_user: UserOut,
+    ) -> SyncEmailsOut:
         self._check_email_in_users_email(data, current_user)
         user_email = await self._get_user_email(data)
         self._check_user_email(current_user, user_email)
-        emails = await self._fetch_emails(data, user_email)
-        await self._save_emails(emails)
-        return emails
+        emails, saved = await self.sync_user_email(user_email, data)
+        return SyncEmailsOut(
+            email=user_email.email,
+            fetched=len(emails),
+            inserted=saved.inserted,
+            updated=saved.updated,
+            emails=emails,
+        )
 
-    async def get_emails(self, user_email_str: str) -> list[Email]:
-        stmt = select(UserEmail).where(UserEmail.email == user_email_str.lower())
-        result = await self.session.execute(stmt)
-        user_email = result.scalar_one_or_none()
+    async def sync_emails_job(
+        self,
+        data: EmailSyncData,
+        user_id: int,
+        on_stage: Callable[[str], Awaitable[None]] | None = None,
+    ) -> SyncResult:
+        user_email = await self._get_user_email(data)
         if not user_email:
             raise ClientError("UserEmail not found.")
+        if user_email.user_id != user_id:
+            raise ClientError("UserEmail does not belong to the current user.")
+        emails, saved = await self.sync_user_email(user_email, data, on_stage)
+        return SyncResult(
+            email=user_email.email,
+            fetched=len(emails),
+            inserted=saved.inserted,
+            updated=saved.updated,
+        )
+
+    async def sync_all_emails(
+        self,
+        data: EmailSyncAllData,
+        current_user: UserOut,
+    ) -> SyncAllEmailsOut:
+        semaphore = asyncio.Semaphore(max(self.settings.sync_all_concurrency, 1))
+
+        async def sync_one(email: str) -> MailboxSyncOut:
+            async with semaphore:
+                return await self._sync_mailbox(
+                    EmailSyncData(email=email, count=data.count, incremental=data.incremental),
+                    current_user.id,
+                )
 
-        stmt = select(Email).where(Email.user_email_id == user_email.id) \
-            .order_by(Email.created_at.desc())
+        mailboxes = await asyncio.gather(*(
+            sync_one(user_email.email) for user_email in current_user.emails
+        ))
+        out = SyncAllEmailsOut(mailboxes=mailboxes)
+        for mailbox in mailboxes:
+            if mailbox.result is None:
+                out.failed += 1
+                continue
+            out.fetched += mailbox.result.fetched
+            out.inserted += mailbox.result.inserted
+            out.updated += mailbox.result.updated
+        return out
+
+    async def sync_user_email(
+        self,
+        user_email: UserEmail,
+        data: EmailSyncData,
+        on_stage: Callable[[str], Awaitable[None]] | None = None,
+    ) -> tuple[list[FetchedEmail], SaveEmailsResult]:
+        if on_stage:
+            await on_stage("fetching")
+        emails, history_id = await self._fetch_emails(data, user_email)
+        if on_stage:
+            await on_stage("saving")
+        with SYNC_STAGE_SECONDS.time("db_upsert"):
+            saved = await self._save_emails(emails)
+        if history_id is not None:
+            await self._advance_history_id(user_email, history_id)
+        user_email.last_synced_at = datetime.now()
+        with SYNC_STAGE_SECONDS.time("db_commit"):
+            await self.session.commit()
+        SYNC_EMAILS.inc("inserted", amount=saved.inserted)
+        SYNC_EMAILS.inc("updated", amount=saved.updated)
+        SYNC_EMAILS.inc("skipped", amount=len(emails) - saved.inserted - saved.updated)
+        await self._invalidate_user_cache(user_email.user_id)
+        return emails, saved
+
+    async def _advance_history_id(self, user_email: UserEmail, history_id: str) -> None:
+        # Syncs of one mailbox can overlap, e.g. a push arriving mid-sync
+        # queues another one. The history id only moves forward, so the
+        # sync that commits last can't rewind it and replay or skip changes.
+        stmt = update(UserEmail).where(
+            UserEmail.id == user_email.id,
+            or_(
+                UserEmail.history_id.is_(None),
+                cast(UserEmail.history_id, Numeric) < int(history_id),
+            ),
+        ).values(history_id=history_id).returning(UserEmail.history_id)
         result = await self.session.execute(stmt)
-        emails = result.scalars().all()
-        return emails
+        if result.scalar_one_or_none() is not None:
+            set_committed_value(user_email, "history_id", history_id)
 
-    async def _save_emails(self, emails: list[Email]):
-        stmt = select(Email).where(
-            Email.external_id.in_([email.external_id for email in emails]),
-            Email.user_email_id == emails[0].user_email_id
+    async def renew_watch(self, user_email: UserEmail) -> datetime:
+        email_provider, provider = self._get_providers(user_email)
+        if not self.settings.gmail_watch_topic:
+            raise ClientError("GMAIL_WATCH_TOPIC is not configured.")
+
+        watch = partial(
+            email_provider.watch,
+            self.http_client,
+            topic_name=self.settings.gmail_watch_topic,
+            label_ids=self.settings.gmail_watch_label_ids,
+            limiter=self._get_rate_limiter(user_email),
         )
-        result = await self.session.execute(stmt)
-        existing_emails = result.scalars().all()
-        existing_external_ids = {email.external_id for email in existing_emails}
-        emails_to_insert = [email for email in emails if email.external_id not in existing_external_ids]
-        self.session.add_all(emails_to_insert)
+        _, expires_at = await self._call_with_access_token(
+            user_email, provider, watch, "Failed to watch mailbox."
+        )
+        user_email.watch_expires_at = expires_at
         await self.session.commit()
+        return expires_at
+
+    async def apply_action(
+        self,
+        data: EmailActionData,
+        current_user: UserOut,
+    ) -> EmailActionResult:
+        self._check_email_in_users_email(data, current_user)
+        self._check_action_ids(data)
+        user_email = await self._get_user_email(data)
+        self._check_user_email(current_user, user_email)
+
+        # Inline requests are capped at one Gmail call, bigger ones go
+        # through /emails/actions/jobs.
+        chunk_size = self.settings.email_action_chunk_size
+        stmt = self._select_action_targets(user_email.id, data, None, chunk_size + 1)
+        result = await self.session.execute(stmt)
+        if len(result.all()) > chunk_size:
+            raise ClientError(
+                f"Action matches more than {chunk_size} emails, use /emails/actions/jobs."
+            )
+        return await self.apply_user_email_action(user_email, data)
+
+    async def apply_action_job(
+        self,
+        data: EmailActionData,
+        user_id: int,
+        progress: EmailActionResult | None = None,
+        on_progress: Callable[[EmailActionResult], Awaitable[None]] | None = None,
+    ) -> EmailActionResult:
+        user_email = await self._get_user_email(data)
+        if not user_email:
+            raise ClientError("UserEmail not found.")
+        if user_email.user_id != user_id:
+            raise ClientError("UserEmail does not belong to the current user.")
+        return await self.apply_user_email_action(user_email, data, progress, on_progress)
+
+    async def apply_user_email_action(
+        self,
+        user_email: UserEmail,
+        data: EmailActionData,
+        progress: EmailActionResult | None = None,
+        on_progress: Callable[[EmailActionResult], Awaitable[None]] | None = None,
+    ) -> EmailActionResult:
+        email_provider, provider = self._get_providers(user_email)
+        self._check_action_ids(data)
+
+        result = progress or EmailActionResult(email=user_email.email, action=data.action)
+        limiter = self._get_rate_limiter(user_email)
+        chunk_size = self.settings.email_action_chunk_size
+        while True:
+            # Keyset over the primary key: each chunk is read after the
+            # last committed one, so a resumed job skips finished chunks.
+            stmt = self._select_action_targets(user_email.id, data, result.last_id, chunk_size)
+            chunk = (await self.session.execute(stmt)).all()
+            if not chunk:
+                break
+
+            # Gmail first: if it fails the local rows stay as they are and
+            # the chunk is retried. Both sides are idempotent.
+            modify = partial(
+                email_provider.modify_messages,
+                self.http_client,
+                message_ids=[email.external_id for email in chunk],
+                action=data.action,
+                limiter=limiter,
+            )
+            await self._call_with_access_token(
+                user_email, provider, modify, "Failed to apply the action."
+            )
+            result.changed += await ApplyEmailAction(self.session).execute(
+                user_email.id, data.action, [email.id for email in chunk]
+            )
+            result.matched += len(chunk)
+            result.last_id = chunk[-1].id
+            await self.session.commit()
+            if on_progress:
+                await on_progress(result)
+            if len(chunk) < chunk_size:
+                break
+        return result
+
+    async def get_emails(
+        self,
+        user_email_str: str,
+        current_user: UserOut,
+        cursor: str | None = None,
+        limit: int = 50,
+        sender: str | None = None,
+    ) -> dict:
+        user_email = await self._get_current_user_email(user_email_str, current_user)
+
+        # Ordered as ix_emails_user_email_id_recieved_at_id (or its sender_id
+        # twin when filtering by sender), so each page is a range scan of
+        # that index starting right after the cursor.
+        stmt = select_emails_out().where(Email.user_email_id == user_email.id) \
+            .order_by(Email.recieved_at.desc(), Email.id) \
+            .limit(limit + 1)
+        if sender:
+            sender_id = select(Sender.id).where(Sender.address == sender.lower())
+            stmt = stmt.where(Email.sender_id == sender_id.scalar_subquery())
+        if cursor:
+            recieved_at, last_id = self._decode_page_cursor(cursor)
+            stmt = stmt.where(
+                Email.recieved_at <= recieved_at,
+                or_(
+                    Email.recieved_at < recieved_at,
+                    Email.id > last_id,
+                ),
+            )
+        read_session = await self._get_read_session()
+        result = await read_session.execute(stmt)
+        emails = [row._asdict() for row in result]
+
+        next_cursor = None
+        if len(emails) > limit:
+            emails = emails[:limit]
+            next_cursor = encode_cursor([emails[-1]["recieved_at"], emails[-1]["id"]])
+        return {"items": emails, "next_cursor": next_cursor}
+
+    async def search_emails(
+        self,
+        user_email_str: str,
+        current_user: UserOut,
+        query: str,
+        cursor: str | None = None,
+        limit: int = 50,
+    ) -> dict:
+        user_email = await self._get_current_user_email(user_email_str, current_user)
+
+        # Served by the (user_email_id, search_vector) GIN index, so only
+        # this mailbox's matches are read and ranked.
+        ts_query = func.websearch_to_tsquery(SEARCH_TEXT_CONFIG, query)
+        rank = func.ts_rank_cd(Email.search_vector, ts_query)
+        stmt = select_emails_out(rank.label("rank")).where(
+            Email.user_email_id == user_email.id,
+            Email.search_vector.op("@@")(ts_query),
+        ).order_by(rank.desc(), Email.id.desc()).limit(limit + 1)
+        if cursor:
+            last_rank, last_id = self._decode_search_cursor(cursor)
+            stmt = stmt.where(or_(
+                rank < last_rank,
+                and_(rank == last_rank, Email.id < last_id),
+            ))
+        read_session = await self._get_read_session()
+        result = await read_session.execute(stmt)
+        emails = [row._asdict() for row in result]
+
+        next_cursor = None
+        if len(emails) > limit:
+            emails = emails[:limit]
+            next_cursor = encode_cursor([emails[-1]["rank"], emails[-1]["id"]])
+        return {"items": emails, "next_cursor": next_cursor}
+
+    async def get_mailbox_stats(
+        self,
+        user_email_str: str,
+        current_user: UserOut,
+        top_senders: int = 10,
+    ) -> MailboxStatsOut:
+        user_email = await self._get_current_user_email(user_email_str, current_user)
+
+        # Both reads hit the summary tables kept up to date by the save path,
+        # so the cost doesn't depend on how many emails the mailbox holds.
+        stmt = select(
+            MailboxStats.total,
+            MailboxStats.unread,
+            MailboxStats.newest_recieved_at,
+        ).where(MailboxStats.user_email_id == user_email.id)
+        read_session = await self._get_read_session()
+        result = await read_session.execute(stmt)
+        totals = result.first()
+
+        stmt = select(
+            Sender.address.label("from_email"),
+            Sender.display_name.label("from_name"),
+            MailboxSenderStats.total,
+            MailboxSenderStats.unread,
+        ).join(Sender, Sender.id == MailboxSenderStats.sender_id) \
+            .where(
+                MailboxSenderStats.user_email_id == user_email.id,
+                MailboxSenderStats.total > 0,
+            ).order_by(MailboxSenderStats.total.desc()).limit(top_senders)
+        read_session = await self._get_read_session()
+        result = await read_session.execute(stmt)
+
+        return MailboxStatsOut(
+            email=user_email.email,
+            **(totals._asdict() if totals else {}),
+            top_senders=[row._asdict() for row in result],
+        )
+
+    async def get_email_content(self, email_id: int, current_user: UserOut) -> bytes:
+        stmt = select(Email.user_email_id, Email.external_id, UserEmail.user_id) \
+            .join(UserEmail, UserEmail.id == Email.user_email_id) \
+            .where(Email.id == email_id)
+        read_session = await self._get_read_session()
+        result = await read_session.execute(stmt)
+        email = result.first()
+        if not email or email.user_id != current_user.id:
+            raise ClientError("Email not found.")
+        return await self.content_cache.get_or_fetch(
+            email.user_email_id,
+            email.external_id,
+            partial(self._fetch_email_content, email.user_email_id, email.external_id),
+        )
+
+    async def export_emails(
+        self,
+        user_email_str: str,
+        current_user: UserOut,
+    ) -> AsyncIterator[bytes]:
+        # Checked eagerly, so a foreign mailbox is a 400 and not a broken stream.
+        user_email = await self._get_current_user_email(user_email_str, current_user)
+        return self._stream_emails(user_email.id)
+
+    async def _stream_emails(self, user_email_id: int) -> AsyncIterator[bytes]:
+        stmt = select_emails_out().where(Email.user_email_id == user_email_id) \
+            .order_by(Email.recieved_at.desc(), Email.id) \
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        read_session = await self._get_read_session()
+        result = await read_session.stream(stmt)
+        async for rows in result.partitions():
+            yield b"".join(to_json(row._asdict()) + b"\n" for row in rows)
+
+    async def _sync_mailbox(self, data: EmailSyncData, user_id: int) -> MailboxSyncOut:
+        # Each mailbox commits in its own session, so one failing mailbox
+        # neither rolls back nor blocks the others.
+        try:
+            async with sessionmaker() as session:
+                email_service = EmailService(
+                    session,
+                    self.settings,
+                    self.http_client,
+                    self.user_cache,
+                    self.redis,
+                )
+                result = await email_service.sync_emails_job(data, user_id)
+        except ClientError as exc:
+            return MailboxSyncOut(email=data.email, error=str(exc))
+        except Exception:
+            logger.exception("Sync of %s crashed", data.email)
+            return MailboxSyncOut(email=data.email, error="Internal error.")
+        return MailboxSyncOut(email=data.email, result=result)
+
+    async def _fetch_email_content(self, user_email_id: int, external_id: str) -> bytes:
+        # Shared by concurrent requests and may outlive the one that started
+        # it, so it runs on its own session instead of that request's.
+        async with sessionmaker() as session:
+            email_service = EmailService(
+                session,
+                self.settings,
+                self.http_client,
+                self.user_cache,
+                self.redis,
+            )
+            return await email_service._fetch_user_email_content(user_email_id, external_id)
+
+    async def _fetch_user_email_content(self, user_email_id: int, external_id: str) -> bytes:
+        # Loaded on the primary session, a token refresh writes to it.
+        user_email = await self.session.get(UserEmail, user_email_id)
+        email_provider, provider = self._get_providers(user_email)
+        fetcher = partial(
+            email_provider.fetch_message_content,
+            self.http_client,
+            message_id=external_id,
+            limiter=self._get_rate_limiter(user_email),
+        )
+        content = await self._call_with_access_token(
+            user_email, provider, fetcher, "Failed to fetch email content."
+        )
+        return content.model_dump_json().encode()
+
+    async def _save_emails(self, emails: list[FetchedEmail]) -> SaveEmailsResult:
+        return await UpsertEmails(
+            self.session,
+            SenderResolver(self.settings),
+            batch_size=self.settings.email_upsert_batch_size,
+            copy_threshold=self.settings.email_copy_threshold,
+        ).execute(emails)
 
     async def _fetch_emails(self, data, user_email):
         fetcher, provider = self._get_provider_strategy(data, user_email)
+        return await self._call_with_access_token(
+            user_email, provider, fetcher, "Failed to fetch emails."
+        )
+
+    async def _call_with_access_token(self, user_email, provider, call, error: str):
+        access_token = await self._get_access_token(user_email, provider)
         try:
-            return await fetcher(user_email.access_token)
+            return await call(access_token)
         except EmailAuthError as exc:
             if not user_email.refresh_token:
-                raise ClientError("Failed to fetch emails.") from exc
+                raise ClientError(error) from exc
+
+            SYNC_UNAUTHORIZED_REFRESHES.inc()
+            access_token = await self._refresh_access_token(
+                user_email, provider, stale_access_token=access_token
+            )
 
             try:
-                tokens = await provider.refresh_token(user_email.refresh_token)
+                return await call(access_token)
+            except EmailAuthError as final_exc:
+                raise ClientError(error) from final_exc
+            except Exception as final_exc:
+                raise ClientError(error) from final_exc
+        except Exception as exc:
+            raise ClientError(error) from exc
+
+    async def _get_access_token(self, user_email, provider) -> str:
+        skew = timedelta(seconds=self.settings.oauth_refresh_skew_seconds)
+        if user_email.refresh_token and user_email.expires_at - skew <= datetime.now():
+            return await self._refresh_access_token(
+                user_email, provider, stale_access_token=user_email.access_token
+            )
+        return user_email.access_token
+
+    async def _refresh_access_token(
+        self,
+        user_email,
+        provider,
+        stale_access_token: str,
+    ) -> str:
+        # Single flight per mailbox: whoever holds the lock refreshes, the
+        # others wait for it and then reuse the token it stored.
+        lock = self.redis.lock(
+            f"oauth:refresh:{user_email.id}",
+            timeout=self.settings.oauth_refresh_lock_timeout_seconds,
+            blocking_timeout=self.settings.oauth_refresh_lock_wait_seconds,
+        )
+        if not await lock.acquire():
+            raise ClientError("Failed to refresh token.")
+        try:
+            await self.session.refresh(user_email)
+            skew = timedelta(seconds=self.settings.oauth_refresh_skew_seconds)
+            if (
+                user_email.access_token != stale_access_token
+                and user_email.expires_at - skew > datetime.now()
+            ):
+                return user_email.access_token
+
+            try:
+                with SYNC_STAGE_SECONDS.time("token_refresh"):
+                    tokens = await provider.refresh_token(user_email.refresh_token)
             except Exception as refresh_exc:
                 raise ClientError("Failed to refresh token.") from refresh_exc
 
@@ -70,26 +558,101 @@ class EmailService:
             if tokens.refresh_token:
                 user_email.refresh_token = tokens.refresh_token
             await self.session.commit()
-
+            return tokens.access_token
+        finally:
             try:
-                return await fetcher(tokens.access_token)
-            except EmailAuthError as final_exc:
-                raise ClientError("Failed to fetch emails.") from final_exc
-            except Exception as final_exc:
-                raise ClientError("Failed to fetch emails.") from final_exc
-        except Exception as exc:
-            raise ClientError("Failed to fetch emails.") from exc
+                await lock.release()
+            except LockError:
+                # The lock timed out while refreshing, someone else owns it now.
+                pass
 
     def _get_provider_strategy(self, data, user_email):
-        if user_email.provider == ProviderType.google:
-            fetcher = partial(
-                GoogleEmailProvider.fetch_emails,
-                user_email.id,
-                count=data.count,
-            )
-            provider = GoogleOAuthProvider(self.settings)
-            return fetcher, provider
-        raise ClientError("Unsupported email provider.")
+        email_provider, provider = self._get_providers(user_email)
+        fetcher = partial(
+            email_provider.fetch_new_emails,
+            self.http_client,
+            user_email.id,
+            count=data.count,
+            start_history_id=user_email.history_id if data.incremental else None,
+            concurrency=self.settings.gmail_fetch_concurrency,
+            use_batch=self.settings.gmail_use_batch,
+            limiter=self._get_rate_limiter(user_email),
+        )
+        return fetcher, provider
+
+    def _get_providers(self, user_email):
+        # Provider modules are imported on first use, see LazyRegistry.
+        if user_email.provider not in EMAIL_PROVIDERS:
+            raise ClientError("Unsupported email provider.")
+        email_provider = EMAIL_PROVIDERS.get(user_email.provider)
+        oauth_provider = OAUTH_PROVIDERS.get(user_email.provider)
+        return email_provider, oauth_provider(self.settings, self.http_client)
+
+    def _get_rate_limiter(self, user_email):
+        # This process's share of the project quota.
+        process_units_per_second = (
+            self.settings.gmail_project_quota_units_per_second
+            / max(self.settings.gmail_processes, 1)
+        )
+        return get_gmail_rate_limiter(
+            self.settings.gmail_mailbox_units_per_second,
+            process_units_per_second,
+            self.settings.gmail_fetch_concurrency,
+            self.settings.gmail_max_retries,
+            self.settings.gmail_backoff_base_seconds,
+            self.settings.gmail_backoff_max_seconds,
+        ).for_mailbox(user_email.id)
+
+    def _select_action_targets(self, user_email_id, data, last_id, limit):
+        stmt = select(Email.id, Email.external_id) \
+            .where(Email.user_email_id == user_email_id) \
+            .order_by(Email.id).limit(limit)
+        if data.ids is not None:
+            stmt = stmt.where(Email.id.in_(data.ids))
+        if data.filter.sender:
+            sender_id = select(Sender.id).where(Sender.address == data.filter.sender.lower())
+            stmt = stmt.where(Email.sender_id == sender_id.scalar_subquery())
+        if data.filter.is_read is not None:
+            stmt = stmt.where(Email.is_read.is_(data.filter.is_read))
+        if data.filter.recieved_before:
+            stmt = stmt.where(Email.recieved_at < data.filter.recieved_before)
+        if data.filter.recieved_after:
+            stmt = stmt.where(Email.recieved_at >= data.filter.recieved_after)
+        if last_id is not None:
+            stmt = stmt.where(Email.id > last_id)
+        return stmt
+
+    async def _invalidate_user_cache(self, user_id: int):
+        stmt = select(UserEmail.email).where(UserEmail.user_id == user_id)
+        result = await self.session.execute(stmt)
+        await self.user_cache.invalidate(list(result.scalars()))
+
+    def _decode_page_cursor(self, cursor: str) -> tuple[datetime, int]:
+        try:
+            recieved_at, last_id = decode_cursor(cursor)
+            return datetime.fromisoformat(recieved_at), int(last_id)
+        except (TypeError, ValueError) as exc:
+            raise ClientError("Invalid cursor.") from exc
+
+    def _decode_search_cursor(self, cursor: str) -> tuple[float, int]:
+        try:
+            last_rank, last_id = decode_cursor(cursor)
+            return float(last_rank), int(last_id)
+        except (TypeError, ValueError) as exc:
+            raise ClientError("Invalid cursor.") from exc
+
+    async def _get_read_session(self) -> AsyncSession:
+        if self.read_session is None:
+            return self.session
+        return await self.read_session.get()
+
+    async def _get_current_user_email(self, user_email_str, current_user):
+        stmt = select(UserEmail).where(UserEmail.email == user_email_str.lower())
+        read_session = await self._get_read_session()
+        result = await read_session.execute(stmt)
+        user_email = result.scalar_one_or_none()
+        self._check_user_email(current_user, user_email)
+        return user_email
 
     def _check_user_email(self, current_user, user_email):
         if not user_email:
@@ -103,6 +666,10 @@ class EmailService:
         user_email = result.scalar_one_or_none()
         return user_email
 
+    def _check_action_ids(self, data):
+        if data.ids is not None and len(data.ids) > self.settings.email_action_max_ids:
+            raise ClientError(f"At most {self.settings.email_action_max_ids} ids per action.")
+
     def _check_email_in_users_email(self, data, current_user):
         if data.email not in [e.email for e in current_user.emails]:
             raise ClientError("Email does not belong to the user.")
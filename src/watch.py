@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+import httpx
+import redis.asyncio as redis
+from sqlalchemy import or_, select
+
+from clients import create_http_client, create_redis_pool
+from config import Settings, get_settings
+from db.models import ProviderType, UserEmail
+from db.utils import dispose_engines, init_engines, sessionmaker
+from errors import ClientError
+from services.auth.cache import UserCache
+from services.emails.sync import EmailService
+
+logger = logging.getLogger("watch")
+
+
+async def get_expiring_mailboxes(settings: Settings) -> list[int]:
+    renew_before = datetime.now() + timedelta(seconds=settings.gmail_watch_renew_before_seconds)
+    stmt = select(UserEmail.id).where(
+        UserEmail.provider == ProviderType.google,
+        or_(
+            UserEmail.watch_expires_at.is_(None),
+            UserEmail.watch_expires_at < renew_before,
+        ),
+    ).order_by(UserEmail.id)
+    async with sessionmaker() as session:
+        result = await session.execute(stmt)
+        return list(result.scalars())
+
+
+async def renew_watch(
+    user_email_id: int,
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+) -> None:
+    try:
+        async with sessionmaker() as session:
+            user_email = await session.get(UserEmail, user_email_id)
+            if user_email is None:
+                return
+            email_service = EmailService(
+                session,
+                settings,
+                http_client,
+                UserCache(redis_client, settings),
+                redis_client,
+            )
+            expires_at = await email_service.renew_watch(user_email)
+    except ClientError as exc:
+        logger.warning("Watch renewal for mailbox %s failed: %s", user_email_id, exc)
+    except Exception:
+        logger.exception("Watch renewal for mailbox %s crashed", user_email_id)
+    else:
+        logger.info("Watch for mailbox %s renewed until %s", user_email_id, expires_at)
+
+
+async def renew_watches(
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+) -> None:
+    mailbox_ids = await get_expiring_mailboxes(settings)
+    logger.info("Renewing %s Gmail watches", len(mailbox_ids))
+    for user_email_id in mailbox_ids:
+        await renew_watch(user_email_id, settings, http_client, redis_client)
+
+
+async def main() -> None:
+    settings = get_settings()
+    if not settings.gmail_watch_topic:
+        raise SystemExit("GMAIL_WATCH_TOPIC is not configured.")
+
+    init_engines(settings)
+    redis_pool = create_redis_pool(settings)
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    try:
+        async with create_http_client(settings) as http_client:
+            while True:
+                await renew_watches(settings, http_client, redis_client)
+                await asyncio.sleep(settings.gmail_watch_renew_interval_seconds)
+    finally:
+        await redis_pool.aclose()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
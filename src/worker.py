@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from functools import partial
+
+import httpx
+import redis.asyncio as redis
+
+from clients import create_http_client, create_redis_pool
+from config import Settings, get_settings
+from db.utils import dispose_engines, init_engines, sessionmaker
+from errors import ClientError
+from metrics import REGISTRY
+from services.auth.cache import UserCache
+from services.emails.jobs import EmailActionJobQueue, SyncJobQueue
+from services.emails.sync import EmailService
+
+logger = logging.getLogger("worker")
+
+QUEUE_POLL_TIMEOUT_SECONDS = 5
+
+
+async def flush_metrics(redis_client: redis.Redis) -> None:
+    # The API's /metrics exports what the jobs counted.
+    try:
+        await REGISTRY.flush_shared(redis_client)
+    except redis.RedisError:
+        logger.warning("Could not flush metrics", exc_info=True)
+
+
+async def run_job(
+    queue: SyncJobQueue,
+    job: tuple,
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+) -> None:
+    job_id, user_id, data = job
+    logger.info("Running sync job %s for %s", job_id, data.email)
+    try:
+        async with sessionmaker() as session:
+            email_service = EmailService(
+                session,
+                settings,
+                http_client,
+                UserCache(redis_client, settings),
+                redis_client,
+            )
+            result = await email_service.sync_emails_job(
+                data,
+                user_id,
+                on_stage=partial(queue.set_stage, job_id),
+            )
+    except ClientError as exc:
+        logger.warning("Sync job %s failed: %s", job_id, exc)
+        await queue.mark_failed(job_id, str(exc))
+    except Exception:
+        logger.exception("Sync job %s crashed", job_id)
+        await queue.mark_failed(job_id, "Internal error.")
+    else:
+        await queue.mark_done(job_id, result)
+
+
+async def run_action_job(
+    queue: EmailActionJobQueue,
+    job: tuple,
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+) -> None:
+    job_id, user_id, data, progress = job
+    logger.info("Running %s job %s for %s", data.action, job_id, data.email)
+    try:
+        async with sessionmaker() as session:
+            email_service = EmailService(
+                session,
+                settings,
+                http_client,
+                UserCache(redis_client, settings),
+                redis_client,
+            )
+            result = await email_service.apply_action_job(
+                data,
+                user_id,
+                progress=progress,
+                on_progress=partial(queue.checkpoint, job_id),
+            )
+    except ClientError as exc:
+        logger.warning("Action job %s failed: %s", job_id, exc)
+        await queue.mark_failed(job_id, str(exc))
+    except Exception:
+        logger.exception("Action job %s crashed", job_id)
+        await queue.mark_failed(job_id, "Internal error.")
+    else:
+        await queue.mark_done(job_id, result)
+
+
+async def consume(
+    queue: SyncJobQueue,
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+) -> None:
+    while True:
+        job = await queue.pop(timeout=QUEUE_POLL_TIMEOUT_SECONDS)
+        if job is not None:
+            await run_job(queue, job, settings, http_client, redis_client)
+            await flush_metrics(redis_client)
+
+
+async def consume_actions(
+    queue: EmailActionJobQueue,
+    settings: Settings,
+    http_client: httpx.AsyncClient,
+    redis_client: redis.Redis,
+) -> None:
+    while True:
+        # Jobs of a worker that died mid-run go back on the queue.
+        requeued = await queue.requeue_expired()
+        if requeued:
+            logger.info("Requeued %s abandoned action jobs", requeued)
+        job = await queue.pop(timeout=QUEUE_POLL_TIMEOUT_SECONDS)
+        if job is not None:
+            await run_action_job(queue, job, settings, http_client, redis_client)
+            await flush_metrics(redis_client)
+
+
+async def main() -> None:
+    settings = get_settings()
+    init_engines(settings)
+    redis_pool = create_redis_pool(settings)
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    queue = SyncJobQueue(redis_client, settings)
+    action_queue = EmailActionJobQueue(redis_client, settings)
+    logger.info(
+        "Starting %s sync and %s action consumers",
+        settings.sync_worker_concurrency,
+        settings.email_action_worker_concurrency,
+    )
+    try:
+        async with create_http_client(settings) as http_client:
+            await asyncio.gather(
+                *(
+                    consume(queue, settings, http_client, redis_client)
+                    for _ in range(settings.sync_worker_concurrency)
+                ),
+                *(
+                    consume_actions(action_queue, settings, http_client, redis_client)
+                    for _ in range(settings.email_action_worker_concurrency)
+                ),
+            )
+    finally:
+        await redis_pool.aclose()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())